@@ -0,0 +1,439 @@
+import os
+import json
+import threading
+import numpy as np
+from filelock import FileLock
+from utils import PROJECTS_DIR, list_projects
+from indexer import get_chunk_index, read_index_revision, normalize_rows
+import tracing
+
+ANN_DIR = os.path.join(PROJECTS_DIR, ".ann")
+VECTORS_FILE = "vectors.npy"
+LAYOUT_FILE = "layout.npz"
+META_FILE = "meta.json"
+LOCK_FILE = "ann.lock"
+
+NPROBE = 8              # lists scanned per query; higher = better recall, slower
+MIN_ROWS_FOR_IVF = 5000 # below this an exact scan is already fast
+KMEANS_ITERS = 10
+TRAIN_SAMPLE = 50000
+RETRAIN_GROWTH = 4      # retrain centroids once the index is this much larger
+COMPACT_SHARE = 0.25    # drop tombstoned rows once they are this share of the index
+RELAYOUT_SHARE = 0.125  # re-sort rows by list once this share was appended since
+MAINTAIN_DELAY = 5.0    # seconds to let changes collect before training and saving
+
+
+#==================== Clustering ====================#
+
+def choose_nlist(n):
+    return max(1, int(4 * np.sqrt(n)))
+
+def train_centroids(vectors, nlist, iters=KMEANS_ITERS, seed=0):
+    # Spherical k-means on a sample; rows are unit length
+    rng = np.random.default_rng(seed)
+    sample = vectors
+    if len(vectors) > TRAIN_SAMPLE:
+        sample = vectors[rng.choice(len(vectors), TRAIN_SAMPLE, replace=False)]
+    nlist = min(nlist, len(sample))
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = sample[assign == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids = normalize_rows(centroids)
+    return centroids
+
+def append_rows(buffer, used, rows):
+    # Grows into a buffer twice the needed size, so adding a paper copies
+    # its own rows rather than the whole index
+    if buffer is None:
+        buffer = np.empty((max(1024, 2 * len(rows)),) + rows.shape[1:], dtype=rows.dtype)
+    elif used + len(rows) > len(buffer):
+        grown = np.empty((2 * (used + len(rows)),) + buffer.shape[1:], dtype=buffer.dtype)
+        grown[:used] = buffer[:used]
+        buffer = grown
+    buffer[used:used + len(rows)] = rows
+    return buffer
+
+def assign_lists(vectors, centroids, batch=8192):
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch):
+        out[start:start + batch] = np.argmax(vectors[start:start + batch] @ centroids.T, axis=1)
+    return out
+
+
+#==================== Index ====================#
+
+class IVFIndex:
+    # Inverted-file index over the chunk embeddings of every project. Rows
+    # are added per paper and point back to (project, paper, row within the
+    # paper). A paper that changes or leaves its project only has its rows
+    # tombstoned and its new rows appended; compaction, retraining and
+    # saving are left to maintain(), off the query path.
+    def __init__(self):
+        self.rows = 0
+        self._vectors = None    # (capacity, d) float32, unit rows; the first self.rows are used
+        self._entry_ids = None  # row -> entries index
+        self._paper_rows = None # row -> row within its paper
+        self._assign = None     # row -> list
+        self._alive = None      # row -> False once tombstoned
+        self.entries = []       # (project, paper_id, signature, first_row, rows)
+        self.live = {}          # project -> {paper_id: entries index}
+        self.revisions = {}     # project -> indexed ChunkIndex revision
+        self.dead = 0
+        self.centroids = None
+        self.trained_rows = 0
+        self._order = None      # the first _laid_out rows sorted by list
+        self._offsets = None
+        self._laid_out = 0
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def vectors(self):
+        return None if self._vectors is None else self._vectors[:self.rows]
+
+    @property
+    def entry_ids(self):
+        return self._entry_ids[:self.rows]
+
+    @property
+    def paper_rows(self):
+        return self._paper_rows[:self.rows]
+
+    @property
+    def assign(self):
+        return self._assign[:self.rows]
+
+    @property
+    def alive(self):
+        return self._alive[:self.rows]
+
+    def copy(self):
+        # Rows below self.rows are never written in place, so the copy shares
+        # them; its buffers end there, so its own appends reallocate. Only
+        # the tombstone flags are copied.
+        other = IVFIndex()
+        other.rows = self.rows
+        if self.rows:
+            other._vectors = self.vectors
+            other._entry_ids = self.entry_ids
+            other._paper_rows = self.paper_rows
+            other._assign = self.assign
+            other._alive = self.alive.copy()
+        other.entries = list(self.entries)
+        other.live = {project: dict(papers) for project, papers in self.live.items()}
+        other.revisions = dict(self.revisions)
+        other.dead = self.dead
+        other.centroids = self.centroids
+        other.trained_rows = self.trained_rows
+        other._order, other._offsets, other._laid_out = self._order, self._offsets, self._laid_out
+        return other
+
+    #---------- persistence ----------#
+
+    # The three files are written and read under one file lock, so another
+    # process never sees vectors from one save with the layout of another.
+
+    @classmethod
+    def load(cls, folder=ANN_DIR):
+        index = cls()
+        meta_path = os.path.join(folder, META_FILE)
+        if not os.path.exists(meta_path):
+            return index
+        try:
+            with FileLock(os.path.join(folder, LOCK_FILE)):
+                with open(meta_path, "r") as f:
+                    meta = json.load(f)
+                vectors = np.load(os.path.join(folder, VECTORS_FILE))
+                with np.load(os.path.join(folder, LAYOUT_FILE)) as layout:
+                    layout = {key: layout[key] for key in layout.files}
+            rows = meta["rows"]
+            if not (len(vectors) == len(layout["entry_ids"]) == len(layout["paper_rows"])
+                    == len(layout["assign"]) == len(layout["alive"]) == rows):
+                print("Discarding inconsistent ANN index")
+                return cls()
+            index.entries = [tuple(entry) for entry in meta["entries"]]
+            index.live = meta["live"]
+            index.revisions = meta["revisions"]
+            index.dead = meta["dead"]
+            index.trained_rows = meta["trained_rows"]
+        except (OSError, ValueError, KeyError) as e:
+            print("Discarding unreadable ANN index:", e)
+            return cls()
+        if rows:
+            index.rows = rows
+            index._vectors = vectors
+            index._entry_ids = layout["entry_ids"]
+            index._paper_rows = layout["paper_rows"]
+            index._assign = layout["assign"]
+            index._alive = layout["alive"]
+        index.centroids = layout["centroids"] if layout["centroids"].size else None
+        return index
+
+    def save(self, folder=ANN_DIR):
+        os.makedirs(folder, exist_ok=True)
+        with FileLock(os.path.join(folder, LOCK_FILE)):
+            self._write(folder)
+
+    def _write(self, folder):
+        empty = np.zeros(0, dtype=np.int32)
+        vectors = self.vectors if self.rows else np.zeros((0, 0), dtype=np.float32)
+        centroids = self.centroids if self.centroids is not None else np.zeros((0, 0), dtype=np.float32)
+        for name, write in [
+            (VECTORS_FILE, lambda f: np.save(f, vectors)),
+            (LAYOUT_FILE, lambda f: np.savez(
+                f, entry_ids=self.entry_ids if self.rows else empty,
+                paper_rows=self.paper_rows if self.rows else empty,
+                assign=self.assign if self.rows else empty,
+                alive=self.alive if self.rows else empty.astype(bool), centroids=centroids
+            )),
+            (META_FILE, None),
+        ]:
+            tmp = os.path.join(folder, name + ".tmp")
+            if write is None:
+                with open(tmp, "w") as f:
+                    json.dump({
+                        "rows": self.rows, "entries": self.entries, "live": self.live,
+                        "revisions": self.revisions, "dead": self.dead, "trained_rows": self.trained_rows
+                    }, f)
+            else:
+                with open(tmp, "wb") as f:
+                    write(f)
+            os.replace(tmp, os.path.join(folder, name))
+
+    #---------- updates ----------#
+
+    def add_paper(self, project, paper_id, signature, embeddings):
+        # Incremental insert: new rows go to their nearest existing list
+        self.remove_paper(project, paper_id)
+        n = len(embeddings)
+        if n == 0:
+            return
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.centroids is not None:
+            assign = assign_lists(embeddings, self.centroids)
+        else:
+            assign = np.zeros(n, dtype=np.int32)
+        self.live.setdefault(project, {})[paper_id] = len(self.entries)
+        self._entry_ids = append_rows(self._entry_ids, self.rows, np.full(n, len(self.entries), dtype=np.int32))
+        self.entries.append((project, paper_id, signature, self.rows, n))
+        self._vectors = append_rows(self._vectors, self.rows, embeddings)
+        self._paper_rows = append_rows(self._paper_rows, self.rows, np.arange(n, dtype=np.int32))
+        self._assign = append_rows(self._assign, self.rows, assign)
+        self._alive = append_rows(self._alive, self.rows, np.ones(n, dtype=bool))
+        self.rows += n
+
+    def remove_paper(self, project, paper_id):
+        # Tombstones the paper's rows; compact() drops them later
+        entry = self.live.get(project, {}).pop(paper_id, None)
+        if entry is None:
+            return False
+        _, _, _, first, n = self.entries[entry]
+        self._alive[first:first + n] = False
+        self.dead += n
+        return True
+
+    def remove_project(self, project):
+        for paper_id in list(self.live.get(project, {})):
+            self.remove_paper(project, paper_id)
+        self.live.pop(project, None)
+        self.revisions.pop(project, None)
+
+    def sync_project(self, project, local):
+        # Diffs the project's papers against its ChunkIndex: rows of papers
+        # that left or changed are tombstoned, new papers are appended
+        changed = False
+        for paper_id, entry in list(self.live.get(project, {}).items()):
+            _, _, signature, _, n = self.entries[entry]
+            info = local.papers.get(paper_id)
+            if info is None or info["signature"] != signature or info["rows"] != n:
+                changed |= self.remove_paper(project, paper_id)
+        live = self.live.get(project, {})
+        starts = local.paper_starts()
+        for paper_id, info in local.papers.items():
+            if info["rows"] and paper_id not in live:
+                start = starts[paper_id]
+                self.add_paper(project, paper_id, info["signature"], local.embeddings[start:start + info["rows"]])
+                changed = True
+        self.revisions[project] = local.revision
+        return changed
+
+    def sync(self, projects=None):
+        # Brings every project's rows up to date with its ChunkIndex, reading
+        # only the small revision file for projects that have not changed.
+        projects = list_projects() if projects is None else projects
+        changed = False
+        for project in list(self.revisions):
+            if project not in projects:
+                self.remove_project(project)
+                changed = True
+        for project in projects:
+            revision = read_index_revision(project)
+            if revision == self.revisions.get(project):
+                continue
+            if revision is None:
+                self.remove_project(project)
+                changed = True
+                continue
+            changed |= self.sync_project(project, get_chunk_index(project))
+        return changed
+
+    def compact(self):
+        # Drops tombstoned rows into new arrays and renumbers the entries
+        if not self.dead:
+            return False
+        keep = self.alive
+        new_rows = np.cumsum(keep) - 1
+        new_ids = np.full(len(self.entries), -1, dtype=np.int32)
+        entries = []
+        for papers in self.live.values():
+            for paper_id, entry in papers.items():
+                project, _, signature, first, n = self.entries[entry]
+                new_ids[entry] = papers[paper_id] = len(entries)
+                entries.append((project, paper_id, signature, int(new_rows[first]), n))
+        self._vectors = np.ascontiguousarray(self.vectors[keep])
+        self._entry_ids = new_ids[self.entry_ids[keep]]
+        self._paper_rows = self.paper_rows[keep]
+        self._assign = self.assign[keep]
+        self._alive = np.ones(len(self._vectors), dtype=bool)
+        self.rows = len(self._vectors)
+        self.entries = entries
+        self.dead = 0
+        self._order = None
+        return True
+
+    def maybe_train(self):
+        n = self.rows - self.dead
+        if n < MIN_ROWS_FOR_IVF:
+            changed = self.centroids is not None
+            self.centroids = None
+            self.trained_rows = 0
+            return changed
+        if self.centroids is not None and n <= RETRAIN_GROWTH * self.trained_rows:
+            return False
+        self.centroids = train_centroids(self.vectors[self.alive] if self.dead else self.vectors, choose_nlist(n))
+        self._assign = assign_lists(self.vectors, self.centroids)
+        self.trained_rows = n
+        self._order = None
+        return True
+
+    #---------- search ----------#
+
+    def _layout(self):
+        # Rows appended since the last sort are scanned separately until
+        # they are a noticeable share of the index
+        if self._order is None or self.rows - self._laid_out > RELAYOUT_SHARE * self.rows:
+            self._laid_out = self.rows
+            self._order = np.argsort(self.assign, kind="stable")
+            self._offsets = np.searchsorted(self.assign[self._order], np.arange(len(self.centroids) + 1))
+        return self._order, self._offsets
+
+    def search(self, query_vec, top_k, nprobe=NPROBE):
+        # Returns (rows, scores), best first
+        if self.rows == self.dead or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        q = normalize_rows(query_vec)
+        if self.centroids is None:
+            candidates = np.flatnonzero(self.alive)
+        else:
+            order, offsets = self._layout()
+            nprobe = min(nprobe, len(self.centroids))
+            probe = np.argpartition(self.centroids @ q, -nprobe)[-nprobe:]
+            recent = np.arange(self._laid_out, self.rows)
+            candidates = np.concatenate(
+                [order[offsets[l]:offsets[l + 1]] for l in probe] + [recent[np.isin(self.assign[recent], probe)]]
+            )
+            candidates = candidates[self.alive[candidates]]
+        scores = self.vectors[candidates] @ q
+        k = min(top_k, len(candidates))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        best = np.argpartition(scores, -k)[-k:]
+        best = best[np.argsort(scores[best])[::-1]]
+        return candidates[best], scores[best]
+
+    def exact_search(self, query_vec, top_k):
+        # Brute-force reference used to measure recall
+        if self.rows == self.dead:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = np.where(self.alive, self.vectors @ normalize_rows(query_vec), -np.inf)
+        k = min(top_k, self.rows - self.dead)
+        best = np.argpartition(scores, -k)[-k:]
+        best = best[np.argsort(scores[best])[::-1]]
+        return best, scores[best]
+
+    def locate(self, row):
+        # (project, paper_id, row within the paper, paper signature)
+        project, paper_id, signature, _, _ = self.entries[self.entry_ids[row]]
+        return project, paper_id, int(self.paper_rows[row]), signature
+
+
+#==================== Shared Instance ====================#
+
+_ann = None
+_ann_lock = threading.Lock()
+_maintenance = None
+_maintenance_lock = threading.Lock()
+_maintain_lock = threading.Lock()
+
+def search_synced(query_vec, top_k, nprobe=NPROBE, projects=None):
+    # The index is kept in memory across queries; each call only re-reads
+    # projects whose chunk index revision changed, and only the papers that
+    # changed in them. Sync and search share one lock so another session's
+    # sync cannot change the rows mid-search. Returns
+    # [(project, paper_id, paper_row, score, signature)], the signature
+    # being that of the paper version the row was taken from.
+    global _ann
+    with _ann_lock:
+        if _ann is None:
+            _ann = IVFIndex.load()
+        with tracing.span("ann_sync"):
+            changed = _ann.sync(projects)
+        with tracing.span("score", rows=len(_ann), nprobe=nprobe):
+            rows, scores = _ann.search(query_vec, top_k, nprobe)
+        hits = []
+        for row, score in zip(rows, scores):
+            project, paper_id, paper_row, signature = _ann.locate(row)
+            hits.append((project, paper_id, paper_row, float(score), signature))
+    if changed:
+        schedule_maintenance()
+    return hits
+
+def schedule_maintenance(delay=MAINTAIN_DELAY):
+    # Debounced: changes arriving within the delay share one pass
+    global _maintenance
+    with _maintenance_lock:
+        if _maintenance is None:
+            _maintenance = threading.Timer(delay, maintain)
+            _maintenance.daemon = True
+            _maintenance.start()
+
+def maintain():
+    # Compacts and retrains a copy of the index outside the lock, catches
+    # the copy up with whatever was synced meanwhile and swaps it in, then
+    # saves a snapshot. Queries only wait for the copies and the catch-up.
+    global _ann, _maintenance
+    with _maintenance_lock:
+        _maintenance = None
+    with _maintain_lock:
+        with _ann_lock:
+            if _ann is None:
+                return
+            work = _ann.copy()
+        with tracing.span("ann_maintain", rows=len(work)):
+            reshaped = work.dead > COMPACT_SHARE * len(work) and work.compact()
+            reshaped |= work.maybe_train()
+        with _ann_lock:
+            if reshaped:
+                work.sync(list(_ann.revisions))
+                _ann = work
+            snapshot = _ann.copy()
+        try:
+            with tracing.span("ann_save", rows=len(snapshot)):
+                snapshot.save()
+        except OSError as e:
+            print("Could not save ANN index:", e)
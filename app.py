@@ -5,13 +5,7 @@ from components import *
 from suggester import *
 import os
 import sys
-import types
-import torch
-
-# Patch to avoid torch.classes introspection error with Streamlit
-if not hasattr(torch, "classes"):
-    torch.classes = types.SimpleNamespace()
-setattr(torch.classes, "__path__", [])
+import sqlite_backend
 
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
@@ -20,9 +14,6 @@ os.environ["TOKENIZERS_PARALLELISM"] = "false"
 if "selected_paper" not in st.session_state:
     st.session_state.selected_paper = None
 
-if "generating_summaries" not in st.session_state:
-    st.session_state.generating_summaries = set()
-
 if "project_selected" not in st.session_state:
     st.session_state.project_selected = False
 
@@ -61,8 +52,8 @@ if not st.session_state.project_selected:
             st.session_state.current_project = selected
             st.session_state.project_selected = True
             st.session_state.last_loaded_project = selected
-            st.session_state.papers = load_saved_papers(selected)
-            st.session_state.generating_summaries = set()
+            # A private copy: the loaded list is shared by every session
+            st.session_state.papers = [dict(p) for p in load_saved_papers(selected)]
             st.session_state.selected_paper = None
             clear_temp_suggestions()
             st.rerun()
@@ -103,6 +94,8 @@ if not st.session_state.project_selected:
             delete = st.form_submit_button("Delete")
         if delete and confirm:
             import shutil
+            sqlite_backend.close_project_db(get_project_path(to_delete))
+            release_project_files(to_delete)
             shutil.rmtree(get_project_path(to_delete))
             st.success(f"Project '{to_delete}' deleted.")
             if st.session_state.current_project == to_delete:
@@ -113,10 +106,12 @@ if not st.session_state.project_selected:
 # === Project View ===
 if st.session_state.project_selected and st.session_state.current_project:
     if "papers" not in st.session_state:
-        st.session_state.papers = load_saved_papers(st.session_state.current_project)
+        st.session_state.papers = [dict(p) for p in load_saved_papers(st.session_state.current_project)]
 
     summary_cache = load_summary_cache(st.session_state.current_project)
+    queue_missing_summaries(st.session_state.papers, summary_cache, st.session_state.current_project)
     render_logo()
+    render_summary_progress(st.session_state.current_project)
 
     # === Detail View ===
     if st.session_state.selected_paper:
@@ -155,7 +150,7 @@ if st.session_state.project_selected and st.session_state.current_project:
             else:
                 # Update
                 paper["citation_id"] = new_id
-                save_papers(st.session_state.papers, st.session_state.current_project)
+                save_changed_papers([paper], st.session_state.papers, st.session_state.current_project)
                 st.success(f"Citation ID updated to [{new_id}]")
                 st.rerun()
         
@@ -180,7 +175,7 @@ if st.session_state.project_selected and st.session_state.current_project:
             "selected_paper": None
         }))
         
-    config = load_project_config(st.session_state.current_project)
+    config = dict(load_project_config(st.session_state.current_project))
 
     with st.expander("Project Info", expanded=False):
         with st.form("project_metadata_form"):
@@ -225,13 +220,6 @@ if st.session_state.project_selected and st.session_state.current_project:
         
     with tab_search:
         render_tab_search()
-        
-    for paper in st.session_state.papers:
-        pid = paper["id"]
-        if pid in st.session_state.generating_summaries:
-            if pid not in summary_cache:
-                result = summarize_paper(pid, paper["summary"], summary_cache, st.session_state.current_project)
-                summary_cache[pid] = result
-                save_summary_cache(summary_cache, st.session_state.current_project)
-            st.session_state.generating_summaries.remove(pid)
-            st.rerun()
+
+    if os.environ.get("SUMMARAIZE_DEBUG") == "1":
+        render_debug_panel()
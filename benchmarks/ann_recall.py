@@ -0,0 +1,84 @@
+# Measures recall and latency of the IVF index against the exact scan.
+#
+#   python benchmarks/ann_recall.py                 # synthetic clustered vectors
+#   python benchmarks/ann_recall.py --projects      # real chunk indexes under projects/
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann import IVFIndex, NPROBE
+from indexer import normalize_rows
+
+
+def synthetic_index(rows, dim, clusters, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(0, clusters, rows)] + 0.6 * rng.normal(size=(rows, dim))
+    index = IVFIndex()
+    index.add_paper("synthetic", "synthetic", None, normalize_rows(vectors))
+    return index
+
+
+def evaluate(index, queries, top_k, nprobes):
+    exact = []
+    t = time.perf_counter()
+    for q in queries:
+        exact.append(set(index.exact_search(q, top_k)[0].tolist()))
+    exact_ms = (time.perf_counter() - t) * 1000 / len(queries)
+
+    report = {"rows": len(index), "lists": 0 if index.centroids is None else len(index.centroids),
+              "top_k": top_k, "exact_ms_per_query": round(exact_ms, 3), "ivf": []}
+    for nprobe in nprobes:
+        hits = 0
+        t = time.perf_counter()
+        for q, truth in zip(queries, exact):
+            hits += len(truth & set(index.search(q, top_k, nprobe)[0].tolist()))
+        ms = (time.perf_counter() - t) * 1000 / len(queries)
+        report["ivf"].append({
+            "nprobe": nprobe,
+            "recall": round(hits / (top_k * len(queries)), 4),
+            "ms_per_query": round(ms, 3),
+            "speedup": round(exact_ms / ms, 2) if ms else None
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, NPROBE, 16, 32])
+    parser.add_argument("--projects", action="store_true", help="use the indexes under projects/")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    args = parser.parse_args()
+
+    if args.projects:
+        index = IVFIndex()
+        index.sync()
+    else:
+        index = synthetic_index(args.rows, args.dim, args.clusters)
+    index.maybe_train()
+
+    rng = np.random.default_rng(1)
+    # Queries are perturbed stored vectors, like questions close to a passage
+    picks = index.vectors[rng.integers(0, len(index), args.queries)]
+    queries = normalize_rows(picks + 0.3 * rng.normal(size=picks.shape) / np.sqrt(picks.shape[1]))
+
+    report = evaluate(index, queries, args.top_k, args.nprobe)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
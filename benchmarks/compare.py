@@ -0,0 +1,34 @@
+# Side-by-side view of two run_benchmarks.py reports.
+#
+#   python benchmarks/compare.py before.json after.json [--metric p50_ms]
+
+import json
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--metric", default="p50_ms")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"{'size':>6}  {'benchmark':<30} {'before':>12} {'after':>12} {'change':>8}")
+    for size, results in before["results"].items():
+        for name, old in results.items():
+            new = after["results"].get(size, {}).get(name)
+            if new is None:
+                continue
+            a = old[args.metric] if isinstance(old, dict) else old
+            b = new[args.metric] if isinstance(new, dict) else new
+            change = f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+            print(f"{size:>6}  {name:<30} {a:>12.3f} {b:>12.3f} {change:>8}")
+
+
+if __name__ == "__main__":
+    main()
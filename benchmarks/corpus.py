@@ -0,0 +1,84 @@
+# Deterministic synthetic papers: metadata, page text and optional PDFs.
+
+import os
+import random
+
+VOCABULARY = """
+attention transformer encoder decoder retrieval embedding dense sparse index
+query passage token layer gradient optimizer benchmark dataset baseline
+accuracy recall precision latency throughput model training inference
+contrastive supervised corpus document ranking reranking vector cluster
+graph node edge convolution recurrent memory sequence alignment language
+vision image audio speech robust adversarial noise regularization dropout
+batch normalization scaling distillation pruning quantization sparse mixture
+expert routing prompt instruction reasoning chain evaluation metric score
+""".split()
+ACRONYMS = ["BERT", "GPT-3.5", "ResNet-50", "MS-MARCO", "BM25", "ViT-B/16", "SQuAD", "F1"]
+
+
+def make_words(n, seed=0):
+    rng = random.Random(seed)
+    return [rng.choice(VOCABULARY) for _ in range(n)]
+
+def make_sentence(rng):
+    words = [rng.choice(VOCABULARY) for _ in range(rng.randint(8, 22))]
+    if rng.random() < 0.3:
+        words.insert(rng.randrange(len(words)), rng.choice(ACRONYMS))
+    return " ".join(words).capitalize() + "."
+
+def make_abstract(seed):
+    rng = random.Random(seed)
+    return " ".join(make_sentence(rng) for _ in range(6))
+
+def make_pages(seed, pages=4, sentences_per_page=30):
+    rng = random.Random(seed)
+    return {
+        str(page): "\n".join(make_sentence(rng) for _ in range(sentences_per_page))
+        for page in range(1, pages + 1)
+    }
+
+def make_paper(index, host=None, id_base=9000):
+    pid = f"{id_base + index // 100000:04d}.{index % 100000:05d}"
+    return {
+        "id": pid,
+        "title": " ".join(make_words(7, seed=id_base * 100000 + index)).title(),
+        "authors": "Ada Example, Alan Example, Grace Example",
+        "summary": make_abstract(id_base * 100000 + index),
+        "published": "2024-01-01T00:00:00Z",
+        # A direct .pdf link so downloads go to the local server, not arXiv
+        "link": f"{host}/pdf/{pid}.pdf" if host else f"http://localhost/pdf/{pid}.pdf",
+        "citation_id": index + 1
+    }
+
+
+#==================== Writing ====================#
+
+def write_pdf(path, text_by_page):
+    import fitz
+    doc = fitz.open()
+    for text in text_by_page.values():
+        page = doc.new_page()
+        page.insert_textbox(page.rect + (40, 40, -40, -40), text, fontsize=7)
+    doc.save(path)
+    doc.close()
+
+def build_corpus(project, count, host=None, pages=4, pdf_dir=None, id_base=9000, cache_text=False):
+    # Saves `count` papers into `project`. With pdf_dir, a PDF per paper is
+    # written there for the fake server; with cache_text, the page text goes
+    # straight into the text store so extraction can be skipped.
+    from utils import save_papers, get_text_cache, content_key, get_shared_store
+
+    papers = [make_paper(i, host, id_base) for i in range(count)]
+    save_papers(papers, project)
+    if pdf_dir:
+        os.makedirs(pdf_dir, exist_ok=True)
+    store = get_text_cache(project) if cache_text else None
+    for i, paper in enumerate(papers):
+        text_by_page = make_pages(-(id_base * 100000 + i), pages)
+        if pdf_dir:
+            write_pdf(os.path.join(pdf_dir, f"{paper['id']}.pdf"), text_by_page)
+        if store is not None:
+            store.put(content_key(paper), text_by_page)
+    if store is not None:
+        get_shared_store().acquire(project, [content_key(p) for p in papers])
+    return papers
@@ -0,0 +1,123 @@
+# Concurrent query encoding from several client processes, each with its
+# own model copy ("local") versus one shared embedding server ("server").
+#
+#   python benchmarks/embed_batching.py --clients 1 4 8 --requests 50
+#   python benchmarks/embed_batching.py --encoder hash     # protocol overhead only
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import multiprocessing as mp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import make_sentence
+
+
+def make_encoder(kind):
+    if kind == "hash":
+        from run_benchmarks import HashEncoder
+        return HashEncoder()
+    from searcher import load_local_model
+    return load_local_model()
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+#==================== Processes ====================#
+
+def run_server(kind, path, max_batch, max_wait):
+    from embed_server import EmbedServer
+    EmbedServer(make_encoder(kind), kind, path, max_batch, max_wait).serve_forever()
+
+def run_client(mode, kind, path, seed, requests, start, results):
+    if mode == "server":
+        from embed_server import connect
+        encoder = connect(kind, lambda: None, path)
+    else:
+        encoder = make_encoder(kind)
+    rng = random.Random(seed)
+    queries = [make_sentence(rng) for _ in range(requests)]
+    encoder.encode(queries[0])      # connection or model warm-up
+    start.wait()
+    times = []
+    for query in queries:
+        t = time.perf_counter()
+        encoder.encode(query)
+        times.append(time.perf_counter() - t)
+    results.put({"times": times, "rss_mb": peak_rss_mb()})
+
+def run_round(mode, kind, path, clients, requests):
+    start = mp.Event()
+    results = mp.Queue()
+    procs = [mp.Process(target=run_client, args=(mode, kind, path, i, requests, start, results)) for i in range(clients)]
+    for p in procs:
+        p.start()
+    # Give every client time to load its model or connect before the clock starts
+    time.sleep(0.5 if kind == "hash" else 10)
+    t = time.perf_counter()
+    start.set()
+    reports = [results.get() for _ in procs]
+    wall = time.perf_counter() - t
+    for p in procs:
+        p.join()
+
+    from run_benchmarks import summarize_times
+    summary = summarize_times([x for r in reports for x in r["times"]], wall)
+    rss = [r["rss_mb"] for r in reports if r["rss_mb"] is not None]
+    summary["client_rss_mb_total"] = round(sum(rss), 1) if rss else None
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=50, help="encode calls per client")
+    parser.add_argument("--encoder", choices=["model", "hash"], default="model")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    # mkdtemp creates the folder 0700, as the server requires
+    folder = tempfile.mkdtemp(prefix="summaraize-embed-")
+    path = os.path.join(folder, "embed.sock")
+    server = mp.Process(target=run_server, args=(args.encoder, path, args.max_batch, args.max_wait_ms / 1000), daemon=True)
+    server.start()
+    time.sleep(1 if args.encoder == "hash" else 15)
+
+    report = {"settings": vars(args), "results": {}}
+    try:
+        for clients in args.clients:
+            for mode in ("local", "server"):
+                result = run_round(mode, args.encoder, path, clients, args.requests)
+                report["results"][f"{mode}-{clients}"] = result
+                print(f"{mode:6} clients={clients:<3} {result['throughput_per_s']:8.1f}/s  "
+                      f"p50={result['p50_ms']:.2f}ms  p95={result['p95_ms']:.2f}ms  "
+                      f"rss={result['client_rss_mb_total']}MB", file=sys.stderr)
+    finally:
+        server.terminate()
+        shutil.rmtree(folder, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# Local stand-in for the Ollama HTTP API and the arXiv endpoints the app
+# calls, with configurable latency. Answers are canned but shaped like the
+# real ones, so parsing code paths run as usual.
+#
+#   python benchmarks/fake_server.py --port 11434 --latency 0.5 --token-latency 0.02
+#
+# Point the app at it with OLLAMA_HOST=http://127.0.0.1:<port> and
+# ARXIV_API_URL=http://127.0.0.1:<port>/api/query.
+
+import os
+import re
+import json
+import time
+import zlib
+import argparse
+import shutil
+import tempfile
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from corpus import make_words, make_abstract, make_pages, write_pdf
+
+
+#==================== Canned Answers ====================#
+
+def answer_for(prompt):
+    if "[1] Title:" in prompt:
+        count = len(re.findall(r"^\s*\[\d+\] Title:", prompt, re.MULTILINE))
+        return "\n".join(f"{i}: {'YES' if i % 2 else 'NO'}" for i in range(1, count + 1))
+    if "generate 3 to 5 concise search queries" in prompt:
+        return "\n".join(f"synthetic query {i}" for i in range(1, 5))
+    if "Only answer YES or NO" in prompt:
+        return "YES"
+    if prompt.lstrip().startswith("Summarize this research abstract"):
+        return "Summary: The paper studies a synthetic problem and reports results.\nKeywords: synthetic, benchmark, retrieval"
+    if "Passage:" in prompt:
+        return extract_answer(prompt)
+    return "OK"
+
+
+def extract_answer(prompt):
+    # The passage sentence sharing most words with the question, if it
+    # covers at least half of them; "Not found." otherwise
+    question = prompt.split("Question:")[-1].split("Paper:")[0]
+    passage = prompt.split("Passage:")[-1].split("Answer:")[0]
+    words = {w for w in re.findall(r"\w+", question.lower()) if len(w) > 3}
+    best, overlap = None, 0
+    for sentence in re.split(r"(?<=\.)\s+", passage.strip()):
+        shared = len(words & set(re.findall(r"\w+", sentence.lower())))
+        if shared > overlap:
+            best, overlap = sentence, shared
+    return best if words and overlap * 2 >= len(words) else "Not found."
+
+
+def feed_for(query, max_results, host, id_list=None):
+    # Search queries get made-up papers; id_list requests echo the IDs back
+    # with a PDF link on this server.
+    seed = zlib.crc32(query.encode("utf-8")) % 10000
+    entries = []
+    ids = id_list or [f"{7000 + seed % 1000:04d}.{seed * 10 + i:05d}" for i in range(max_results)]
+    for i, pid in enumerate(ids):
+        alternate = f"{host}/pdf/{pid}.pdf" if id_list else f"http://arxiv.org/abs/{pid}v1"
+        entries.append(f"""
+  <entry>
+    <id>http://arxiv.org/abs/{pid}v1</id>
+    <published>2024-01-01T00:00:00Z</published>
+    <title>{" ".join(make_words(8, seed=seed + i)).title()}</title>
+    <summary>{make_abstract(seed + i)}</summary>
+    <author><name>Ada Example</name></author>
+    <author><name>Alan Example</name></author>
+    <link href="{alternate}" rel="alternate" type="text/html"/>
+    <link title="pdf" href="{host}/pdf/{pid}.pdf" rel="related" type="application/pdf"/>
+  </entry>""")
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <title>arXiv Query</title>{"".join(entries)}
+</feed>"""
+
+
+#==================== Server ====================#
+
+class FakeServer:
+    def __init__(self, port=0, latency=0.0, token_latency=0.0, pdf_dir=None):
+        self.latency = latency              # seconds before the first byte of an answer
+        self.token_latency = token_latency  # seconds between streamed tokens
+        self.pdf_dir = pdf_dir              # served at /pdf/<id>.pdf
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._generated = tempfile.mkdtemp(prefix="fake-pdfs-")
+
+        server = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server._count()
+                url = urlparse(self.path)
+                if url.path == "/api/tags":
+                    return self._send(200, json.dumps({"models": [{"name": "llama3:latest"}]}), "application/json")
+                if url.path == "/api/query":
+                    params = parse_qs(url.query)
+                    id_list = params["id_list"][0].split(",") if "id_list" in params else None
+                    query = params.get("search_query", [""])[0]
+                    max_results = int(params.get("max_results", ["5"])[0])
+                    return self._send(200, feed_for(query, max_results, server.url, id_list), "application/atom+xml")
+                if url.path.startswith("/pdf/"):
+                    return self._send(200, server.pdf_bytes(os.path.basename(url.path)), "application/pdf")
+                self._send(404, "not found", "text/plain")
+
+            def do_POST(self):
+                server._count()
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if urlparse(self.path).path != "/api/generate":
+                    return self._send(404, json.dumps({"error": "not found"}), "application/json")
+                time.sleep(server.latency)
+                answer = answer_for(body.get("prompt", ""))
+                # Rough token counts, reported like Ollama on the final object
+                counts = {"prompt_eval_count": len(body.get("prompt", "").split()), "eval_count": len(answer.split())}
+                if not body.get("stream", True):
+                    time.sleep(server.token_latency * len(answer.split()))
+                    return self._send(200, json.dumps({"response": answer, "done": True, **counts}), "application/json")
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for token in re.findall(r"\s*\S+", answer):
+                    self._chunk(json.dumps({"response": token, "done": False}) + "\n")
+                    time.sleep(server.token_latency)
+                self._chunk(json.dumps({"response": "", "done": True, **counts}) + "\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, text):
+                data = text.encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def _send(self, status, payload, content_type):
+                data = payload if isinstance(payload, bytes) else payload.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def pdf_bytes(self, name):
+        # Files in pdf_dir are served as they are; other IDs get a generated PDF
+        path = os.path.join(self.pdf_dir, name) if self.pdf_dir else None
+        if path is None or not os.path.exists(path):
+            os.makedirs(self._generated, exist_ok=True)
+            path = os.path.join(self._generated, name)
+            if not os.path.exists(path):
+                write_pdf(path, make_pages(zlib.crc32(name.encode("utf-8"))))
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _count(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        shutil.rmtree(self._generated, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before each answer")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="seconds per streamed token")
+    parser.add_argument("--pdf-dir", help="folder of <id>.pdf files to serve under /pdf/; other IDs get generated PDFs")
+    args = parser.parse_args()
+
+    server = FakeServer(args.port, args.latency, args.token_latency, args.pdf_dir)
+    print(f"Fake Ollama/arXiv server on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
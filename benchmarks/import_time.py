@@ -0,0 +1,67 @@
+# Measures how long a fresh process takes to import the app's modules, and
+# how long the embedding model takes to load on first use.
+#
+#   python benchmarks/import_time.py [--repeat 5] [--with-model]
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import time
+t = time.perf_counter()
+import components, summarizer, suggester
+elapsed = time.perf_counter() - t
+import sys
+heavy = sorted(m for m in ("torch", "sentence_transformers", "sklearn", "fitz") if m in sys.modules)
+print(elapsed, ",".join(heavy))
+"""
+
+MODEL_SNIPPET = """
+import time
+import searcher
+t = time.perf_counter()
+searcher.get_model()
+print(time.perf_counter() - t)
+"""
+
+
+def run(snippet):
+    out = subprocess.run(
+        [sys.executable, "-c", snippet],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1]
+    return out.split(" ")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--with-model", action="store_true", help="also time the first get_model() call")
+    args = parser.parse_args()
+
+    import_times = []
+    heavy = ""
+    for _ in range(args.repeat):
+        elapsed, *rest = run(IMPORT_SNIPPET)
+        import_times.append(float(elapsed))
+        heavy = rest[0] if rest else ""
+
+    report = {
+        "import_seconds_median": statistics.median(import_times),
+        "import_seconds_min": min(import_times),
+        "heavy_modules_loaded_at_import": heavy.split(",") if heavy else []
+    }
+    if args.with_model:
+        report["first_model_load_seconds"] = float(run(MODEL_SNIPPET)[0])
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# Search with and without the cross-encoder rerank stage on a synthetic
+# corpus with planted facts. Each question has one passage that answers it
+# and several distractor passages that mention the same subject, so the
+# report shows how many LLM calls reranking saves and whether the answers
+# survive. --sweep checks candidate score cutoffs for --rerank-threshold
+# without calling the LLM.
+#
+#   python benchmarks/rerank_eval.py --papers 200 --questions 30 --top-k 3
+#   python benchmarks/rerank_eval.py --sweep 0.01 0.05 0.1 0.2 0.5
+#   python benchmarks/rerank_eval.py --encoder hash --reranker overlap   # no models needed
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import contextlib
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_server import FakeServer
+from corpus import build_corpus
+from run_benchmarks import HashEncoder, summarize_times
+
+FACTS = [
+    ("The {s} experiments used a learning rate of {v}.", "Which learning rate did the {s} experiments use?",
+     lambda rng: f"{rng.randint(1, 9)}e-{rng.randint(3, 5)}"),
+    ("{s} was trained on {v} GPUs for two days.", "How many GPUs was {s} trained on?",
+     lambda rng: str(rng.choice([4, 8, 16, 32, 64]))),
+    ("The {s} model is evaluated on the {v} dataset.", "Which dataset is the {s} model evaluated on?",
+     lambda rng: rng.choice(["Qasper", "PubMedQA", "SciFact", "NQ-Open", "HotpotQA"])),
+]
+DISTRACTORS = [
+    "{s} is compared against strong baselines in Section 4.",
+    "Further details about {s} are given in the appendix.",
+    "We release the code for {s} with this paper.",
+    "Prior work motivated the design of {s}.",
+]
+
+
+class OverlapReranker:
+    # Stand-in for the cross-encoder: share of question words in the passage
+    def predict(self, pairs, **kwargs):
+        scores = []
+        for query, passage in pairs:
+            words = {w.strip("?.,").lower() for w in query.split() if len(w) > 3}
+            text = passage.lower()
+            scores.append(sum(w in text for w in words) / max(len(words), 1))
+        return scores
+
+
+def insert_sentence(pages, sentence, rng):
+    page = rng.choice(sorted(pages))
+    lines = pages[page].split("\n")
+    lines.insert(rng.randrange(len(lines) + 1), sentence)
+    pages[page] = "\n".join(lines)
+
+
+def plant_facts(project, papers, questions, distractors, seed=0):
+    # Rewrites the cached page text of random papers; the index picks the
+    # change up through the text signature like any re-extraction.
+    from utils import get_text_cache, content_key
+    rng = random.Random(seed)
+    store = get_text_cache(project)
+    pages = {p["id"]: store.get_pages(content_key(p)) for p in papers}
+    cases = []
+    for i in range(questions):
+        subject = f"Zorbex{i}"
+        fact, question, value = FACTS[i % len(FACTS)]
+        answer = value(rng)
+        insert_sentence(pages[rng.choice(papers)["id"]], fact.format(s=subject, v=answer), rng)
+        for template in rng.sample(DISTRACTORS, min(distractors, len(DISTRACTORS))):
+            insert_sentence(pages[rng.choice(papers)["id"]], template.format(s=subject), rng)
+        cases.append({"question": question.format(s=subject), "answer": answer})
+    for paper in papers:
+        store.put(content_key(paper), pages[paper["id"]])
+    return cases
+
+
+def run_mode(cases, papers, project, server, workdir, rerank, args):
+    import llm_cache
+    import searcher
+
+    # A fresh LLM cache per mode, so neither run answers from the other's calls
+    llm_cache._cache = llm_cache.ResponseCache(os.path.join(workdir, f"llm-{'rerank' if rerank else 'base'}.sqlite3"))
+    requests_before = server.requests
+    times = []
+    answered = 0
+    forwarded = 0
+    start = time.perf_counter()
+    for case in cases:
+        t = time.perf_counter()
+        results = searcher.search_with_semantic_filter(
+            case["question"], papers, project, top_k=args.top_k,
+            rerank=rerank, rerank_threshold=args.threshold
+        )
+        times.append(time.perf_counter() - t)
+        forwarded += len(results)
+        answered += any(case["answer"] in r["answer"] for r in results)
+    report = summarize_times(times, time.perf_counter() - start)
+    report.update({
+        "llm_calls": server.requests - requests_before,
+        "llm_calls_per_query": round(forwarded / len(cases), 3),
+        "answer_recall": round(answered / len(cases), 3)
+    })
+    return report
+
+
+def sweep(cases, papers, project, thresholds, args):
+    # Reranks once per question without a cutoff, then applies each cutoff
+    # the way rerank() does (the best passage is always kept)
+    import numpy as np
+    import searcher
+
+    ranked = [
+        searcher.retrieve_chunks(case["question"], papers, project, args.top_k, rerank=True, rerank_threshold=None)
+        for case in cases
+    ]
+    answer_scores = [c["rerank_score"] for case, chunks in zip(cases, ranked) for c in chunks if case["answer"] in c["chunk"]]
+    other_scores = [c["rerank_score"] for case, chunks in zip(cases, ranked) for c in chunks if case["answer"] not in c["chunk"]]
+    rows = []
+    for threshold in [None] + sorted(thresholds):
+        kept = [
+            [c for rank, c in enumerate(chunks) if threshold is None or rank == 0 or c["rerank_score"] >= threshold]
+            for chunks in ranked
+        ]
+        rows.append({
+            "threshold": threshold,
+            "answer_passage_recall": round(sum(
+                any(case["answer"] in c["chunk"] for c in chunks) for case, chunks in zip(cases, kept)
+            ) / len(cases), 3),
+            "llm_calls_per_query": round(sum(len(chunks) for chunks in kept) / len(cases), 3)
+        })
+    return {
+        "answer_score_p50": round(float(np.median(answer_scores)), 4) if answer_scores else None,
+        "other_score_p50": round(float(np.median(other_scores)), 4) if other_scores else None,
+        "thresholds": rows
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--papers", type=int, default=200)
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--questions", type=int, default=30)
+    parser.add_argument("--distractors", type=int, default=3, help="passages per question that mention the subject only")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--threshold", type=float, help="rerank_threshold for the rerank run (default: none)")
+    parser.add_argument("--sweep", type=float, nargs="+", help="score cutoffs to compare instead of the LLM runs")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake LLM seconds per answer")
+    parser.add_argument("--encoder", choices=["model", "hash"], default="model")
+    parser.add_argument("--reranker", choices=["model", "overlap"], default="model")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="summaraize-rerank-")
+    # One request at a time is what the Search tab's worker pool sees per answer
+    server = FakeServer(latency=args.latency).start()
+    os.environ["OLLAMA_HOST"] = server.url
+    os.environ["SUMMARAIZE_CACHE_DIR"] = os.path.join(workdir, "llm_cache")
+    os.environ["SUMMARAIZE_EMBED_SERVER"] = "off"
+    os.chdir(workdir)
+
+    import searcher
+    import reranker
+    if args.encoder == "hash":
+        searcher._model = HashEncoder()
+    if args.reranker == "overlap":
+        reranker._reranker = OverlapReranker()
+    if args.threshold is None:
+        args.threshold = reranker.RERANK_THRESHOLD
+
+    report = {"settings": vars(args), "results": {}}
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            project = "rerank-eval"
+            papers = build_corpus(project, args.papers, host=server.url, pages=args.pages, cache_text=True)
+            cases = plant_facts(project, papers, args.questions, args.distractors)
+            searcher.find_relevant_chunks(cases[0]["question"], papers, project)    # build the index
+            reranker.rerank(cases[0]["question"], [{"chunk": "warm-up"}], 1)        # load the cross-encoder
+            if args.sweep:
+                report["results"]["sweep"] = sweep(cases, papers, project, args.sweep, args)
+            else:
+                for name, rerank in (("baseline", False), ("rerank", True)):
+                    report["results"][name] = run_mode(cases, papers, project, server, workdir, rerank, args)
+    finally:
+        server.stop()
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.sweep:
+        result = report["results"]["sweep"]
+        print(f"median score: answer passages {result['answer_score_p50']}, others {result['other_score_p50']}", file=sys.stderr)
+        for row in result["thresholds"]:
+            print(f"threshold {str(row['threshold']):6} answer passages kept {row['answer_passage_recall']:.2f}  "
+                  f"LLM calls/query {row['llm_calls_per_query']:.2f}", file=sys.stderr)
+    else:
+        base, rr = report["results"]["baseline"], report["results"]["rerank"]
+        print(f"answer recall {base['answer_recall']:.2f} -> {rr['answer_recall']:.2f}, "
+              f"LLM calls {base['llm_calls']} -> {rr['llm_calls']}, "
+              f"mean latency {base['mean_ms']:.0f} -> {rr['mean_ms']:.0f} ms", file=sys.stderr)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
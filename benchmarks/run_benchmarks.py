@@ -0,0 +1,191 @@
+# End-to-end timings of the hot paths on synthetic corpora, against a local
+# fake Ollama/arXiv server, so runs are comparable across changes.
+#
+#   python benchmarks/run_benchmarks.py --sizes 10 100 1000 --output before.json
+#   python benchmarks/run_benchmarks.py --encoder hash      # skip the real model
+#   python benchmarks/compare.py before.json after.json
+
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import hashlib
+import argparse
+import contextlib
+import platform
+import tempfile
+import subprocess
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_server import FakeServer
+from corpus import build_corpus, make_sentence
+
+
+#==================== Helpers ====================#
+
+class HashEncoder:
+    # Stand-in for the sentence-transformers model: hashed bag of words.
+    # Only useful to time everything around the model.
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def encode(self, texts):
+        single = isinstance(texts, str)
+        texts = [texts] if single else texts
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                h = int.from_bytes(hashlib.md5(word.encode("utf-8")).digest()[:4], "little")
+                out[row, h % self.dim] += 1.0
+        return out[0] if single else out
+
+
+def summarize_times(times, wall=None):
+    ms = np.array(times) * 1000
+    return {
+        "count": len(times),
+        "total_s": round(float(wall if wall is not None else sum(times)), 4),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "max_ms": round(float(ms.max()), 3),
+        "throughput_per_s": round(len(times) / (wall if wall is not None else sum(times)), 3) if times else 0.0
+    }
+
+def measure(fn, items):
+    times = []
+    start = time.perf_counter()
+    for item in items:
+        t = time.perf_counter()
+        fn(item)
+        times.append(time.perf_counter() - t)
+    return summarize_times(times, time.perf_counter() - start)
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+#==================== Benchmarks ====================#
+
+def run_size(size, slot, args, server, workdir):
+    import utils
+    import searcher
+    import summarizer
+    import suggester
+
+    project = f"bench-{size}"
+    pdf_dir = os.path.join(workdir, "pdfs")
+    server.pdf_dir = pdf_dir
+    t = time.perf_counter()
+    papers = build_corpus(project, size, host=server.url, pages=args.pages, pdf_dir=pdf_dir, id_base=9000 + slot)
+    print(f"[{size}] corpus ready in {time.perf_counter() - t:.1f}s", file=sys.stderr)
+
+    rng = random.Random(size)
+    queries = [make_sentence(rng) for _ in range(args.queries)]
+    report = {}
+
+    report["extract_and_cache_pdf_text"] = measure(
+        lambda p: utils.extract_and_cache_pdf_text(p, project), papers
+    )
+
+    t = time.perf_counter()
+    searcher.find_relevant_chunks(queries[0], papers, project, top_k=args.top_k)
+    report["index_build_s"] = round(time.perf_counter() - t, 4)
+    report["find_relevant_chunks"] = measure(
+        lambda q: searcher.find_relevant_chunks(q, papers, project, top_k=args.top_k), queries
+    )
+
+    report["search_with_semantic_filter"] = measure(
+        lambda q: searcher.search_with_semantic_filter(q, papers, project, top_k=args.top_k),
+        queries[:args.llm_queries]
+    )
+
+    cache = {}
+    report["summarize_paper"] = measure(
+        lambda p: summarizer.summarize_paper(p["id"], p["summary"], cache, project),
+        papers[:args.summaries]
+    )
+
+    # A different project title per run keeps every prompt out of the LLM cache
+    configs = [
+        {"title": f"Synthetic project {size}-{i}", "description": "Benchmark run", "keywords": ["retrieval"]}
+        for i in range(args.suggestion_runs)
+    ]
+    report["generate_live_suggestions"] = measure(
+        lambda c: suggester.generate_live_suggestions(c, project), configs
+    )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--pages", type=int, default=4, help="pages per synthetic paper")
+    parser.add_argument("--queries", type=int, default=20, help="queries for find_relevant_chunks")
+    parser.add_argument("--llm-queries", type=int, default=5, help="queries for search_with_semantic_filter")
+    parser.add_argument("--summaries", type=int, default=20)
+    parser.add_argument("--suggestion-runs", type=int, default=3)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM seconds before each answer")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="fake LLM seconds per token")
+    parser.add_argument("--encoder", choices=["model", "hash"], default="model")
+    parser.add_argument("--workdir", help="defaults to a temporary folder that is removed afterwards")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="summaraize-bench-"))
+    os.makedirs(workdir, exist_ok=True)
+    server = FakeServer(latency=args.latency, token_latency=args.token_latency).start()
+
+    # The app reads these at import time and keeps its data under ./projects
+    os.environ["OLLAMA_HOST"] = server.url
+    os.environ["ARXIV_API_URL"] = f"{server.url}/api/query"
+    os.environ["SUMMARAIZE_CACHE_DIR"] = os.path.join(workdir, "llm_cache")
+    os.chdir(workdir)
+
+    import searcher
+    if args.encoder == "hash":
+        searcher._model = HashEncoder()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "encoder": searcher.EMBEDDING_MODEL if args.encoder == "model" else "hash",
+            "settings": {k: v for k, v in vars(args).items() if k not in ("output", "workdir")}
+        },
+        "results": {}
+    }
+    try:
+        # The app prints progress; keep stdout for the report
+        with contextlib.redirect_stdout(sys.stderr):
+            for slot, size in enumerate(args.sizes):
+                report["results"][str(size)] = run_size(size, slot, args, server, workdir)
+    finally:
+        server.stop()
+        os.chdir(ROOT)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    report["meta"]["fake_server_requests"] = server.requests
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
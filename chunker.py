@@ -0,0 +1,138 @@
+import re
+from collections import Counter
+
+# Windows are measured in TOKEN_PATTERN tokens, which already split numbers
+# and punctuation apart like word-pieces do; the 56 spare pieces under
+# MiniLM's 256 limit are for words the model tokenizer breaks up further.
+MAX_TOKENS = 200
+OVERLAP_TOKENS = 40     # carried over from the end of the previous window
+MIN_TOKENS = 20
+BOILERPLATE_MIN_PAGES = 3
+BOILERPLATE_PAGE_SHARE = 0.5
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+(?=[A-Z0-9(\[])|\n\s*\n")
+REFERENCES_HEADING = re.compile(r"^\s*(\d+\.?\s*)?(references|bibliography)\s*$", re.IGNORECASE)
+
+
+def chunker_settings():
+    # Part of every stored embedding signature, so cached chunks are redone
+    # when these change
+    return f"{MAX_TOKENS}/{OVERLAP_TOKENS}/{MIN_TOKENS}/{BOILERPLATE_MIN_PAGES}/{BOILERPLATE_PAGE_SHARE}"
+
+def count_tokens(text):
+    return len(TOKEN_PATTERN.findall(text))
+
+def normalize_line(line):
+    # Page numbers and running counters differ per page; ignore digits
+    return re.sub(r"\s+", " ", re.sub(r"\d+", "#", line)).strip().lower()
+
+
+#==================== Cleaning ====================#
+
+def find_boilerplate(pages):
+    # Lines (headers, footers, running titles) repeated on many pages
+    if len(pages) < BOILERPLATE_MIN_PAGES:
+        return set()
+    counts = Counter()
+    for text in pages.values():
+        counts.update({normalize_line(l) for l in text.splitlines() if l.strip()})
+    threshold = max(BOILERPLATE_MIN_PAGES, BOILERPLATE_PAGE_SHARE * len(pages))
+    return {line for line, n in counts.items() if n >= threshold}
+
+def blank_out(text, boilerplate, in_references, allow_references=True):
+    # Replaces dropped lines with spaces so offsets into the original page
+    # text stay valid. Returns (cleaned, in_references).
+    out = []
+    for line in text.splitlines(keepends=True):
+        if allow_references and not in_references and REFERENCES_HEADING.match(line):
+            in_references = True
+        if in_references or normalize_line(line) in boilerplate:
+            out.append(re.sub(r"[^\n]", " ", line))
+        else:
+            out.append(line)
+    return "".join(out), in_references
+
+
+#==================== Windows ====================#
+
+def split_span(text, s, e, max_tokens):
+    # Cuts at most max_tokens tokens at a time, backing off to the last
+    # space so words stay whole unless one alone is longer than that
+    tokens = list(TOKEN_PATTERN.finditer(text, s, e))
+    result = []
+    i = 0
+    while i < len(tokens):
+        j = min(i + max_tokens, len(tokens))
+        if j < len(tokens):
+            k = j
+            while k > i + 1 and tokens[k].start() == tokens[k - 1].end():
+                k -= 1
+            if tokens[k].start() != tokens[k - 1].end():
+                j = k
+        result.append((tokens[i].start(), tokens[j - 1].end()))
+        i = j
+    return result
+
+def sentence_spans(text, max_tokens=MAX_TOKENS):
+    spans = []
+    start = 0
+    for end in [m.start() for m in SENTENCE_END.finditer(text)] + [len(text)]:
+        piece = text[start:end]
+        if piece.strip():
+            # Trim so offsets point at the first and last real character
+            s = start + len(piece) - len(piece.lstrip())
+            spans.append((s, start + len(piece.rstrip())))
+        match = SENTENCE_END.match(text, end)
+        start = match.end() if match else end
+
+    # Split sentences that alone exceed the window
+    result = []
+    for s, e in spans:
+        if count_tokens(text[s:e]) <= max_tokens:
+            result.append((s, e))
+        else:
+            result.extend(split_span(text, s, e, max_tokens))
+    return result
+
+def window_spans(text, max_tokens=MAX_TOKENS, overlap_tokens=OVERLAP_TOKENS):
+    spans = sentence_spans(text, max_tokens)
+    sizes = [count_tokens(text[s:e]) for s, e in spans]
+    windows = []
+    i = 0
+    while i < len(spans):
+        j, total = i, 0
+        while j < len(spans) and (total + sizes[j] <= max_tokens or j == i):
+            total += sizes[j]
+            j += 1
+        windows.append((spans[i][0], spans[j - 1][1], total))
+        if j >= len(spans):
+            break
+        # Step back over trailing sentences to overlap with the next window
+        back, k = 0, j
+        while k - 1 > i and back + sizes[k - 1] <= overlap_tokens:
+            k -= 1
+            back += sizes[k]
+        i = k
+    return windows
+
+def chunk_pages(pages, max_tokens=MAX_TOKENS, overlap_tokens=OVERLAP_TOKENS):
+    # Returns [{"page", "start", "end", "chunk"}]; start/end are character
+    # offsets into the original page text for highlighting.
+    boilerplate = find_boilerplate(pages)
+    in_references = False
+    chunks = []
+    for i, (page, text) in enumerate(pages.items()):
+        # A "References" line on the first page is a table of contents entry
+        allow_references = i > 0 or len(pages) == 1
+        cleaned, in_references = blank_out(text, boilerplate, in_references, allow_references)
+        for start, end, tokens in window_spans(cleaned, max_tokens, overlap_tokens):
+            if tokens < MIN_TOKENS:
+                continue
+            chunks.append({
+                "page": page,
+                "start": start,
+                "end": end,
+                "chunk": re.sub(r"\s+", " ", cleaned[start:end]).strip()
+            })
+    return chunks
@@ -0,0 +1,250 @@
+# Headless entry point: the same project data as the app, without Streamlit.
+#
+#   python cli.py ingest <project> 2101.00001 2101.00002 --file ids.txt
+#   python cli.py index <project>
+#   python cli.py summarize <project>
+#   python cli.py warm <project>            # ingest PDFs, index and summarize
+#   python cli.py search <project> "question" --top-k 5 [--no-llm] [--all-projects] [--rerank]
+#   python cli.py list
+#
+# Every step skips work that is already on disk, so an interrupted run
+# picks up where it stopped when started again.
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils import (
+    list_projects, get_project_path, load_project_config, save_project_config, load_saved_papers,
+    parse_arxiv_ids, fetch_arxiv_metadata_batch, add_papers_to_project, ingest_papers
+)
+
+INGEST_BATCH = 20
+
+
+#==================== Output ====================#
+
+class Progress:
+    # One line per update on stderr, so stdout stays clean for JSON
+    def __init__(self, label, total):
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+
+    def update(self, n=1, failed=0):
+        self.done += n
+        self.failed += failed
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed else 0.0
+        note = f", {self.failed} failed" if self.failed else ""
+        print(f"{self.label}: {self.done}/{self.total}{note} ({rate:.1f}/s)", file=sys.stderr, flush=True)
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+def emit(data):
+    print(json.dumps(data, indent=2, ensure_ascii=False))
+
+
+#==================== Commands ====================#
+
+def ensure_project(project):
+    if not os.path.isdir(get_project_path(project)):
+        os.makedirs(get_project_path(project), exist_ok=True)
+        save_project_config(project, {"title": project, "description": "", "keywords": []})
+        log(f"Created project '{project}'")
+
+def cmd_list(args):
+    return [
+        {"project": name, "papers": len(load_saved_papers(name)), "title": load_project_config(name).get("title", "")}
+        for name in list_projects()
+    ]
+
+def cmd_ingest(args):
+    ensure_project(args.project)
+    text = " ".join(args.ids)
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            text += "\n" + f.read()
+    ids, unrecognized = parse_arxiv_ids(text)
+    if unrecognized:
+        log("Not recognized as arXiv IDs: " + ", ".join(unrecognized))
+
+    papers = [dict(p) for p in load_saved_papers(args.project)]
+    known = {p["id"] for p in papers}
+    new_ids = [i for i in ids if i not in known]
+    log(f"{len(ids)} IDs, {len(new_ids)} not yet in '{args.project}'")
+
+    not_found = []
+    if new_ids:
+        fetched, not_found = fetch_arxiv_metadata_batch(new_ids)
+        added, _ = add_papers_to_project(fetched, papers, args.project)
+        log(f"Added {len(added)} paper(s)")
+        if not_found:
+            log("Could not fetch: " + ", ".join(not_found))
+
+    failed = [] if args.skip_pdfs else download_and_extract(args.project, papers, args.workers)
+    return {"project": args.project, "papers": len(papers), "not_found": not_found, "unrecognized": unrecognized, "failed": failed}
+
+def download_and_extract(project, papers, workers=None):
+    # Batches keep memory bounded and make progress visible; each finished
+    # batch is already in the text store if the run is interrupted.
+    progress = Progress("download+extract", len(papers))
+    failed = []
+    for start in range(0, len(papers), INGEST_BATCH):
+        batch = papers[start:start + INGEST_BATCH]
+        kwargs = {"max_workers": workers} if workers else {}
+        results = ingest_papers(batch, project, **kwargs)
+        errors = [pid for pid, r in results.items() if isinstance(r, Exception)]
+        for pid in errors:
+            log(f"  {pid}: {results[pid]}")
+        failed.extend(errors)
+        progress.update(len(batch), failed=len(errors))
+    return failed
+
+def cmd_index(args):
+    from searcher import get_model
+    from indexer import load_synced_index, ENCODE_BATCH_SIZE
+
+    papers = load_saved_papers(args.project)
+    start = time.perf_counter()
+    index = load_synced_index(args.project, papers, get_model().encode, args.batch_size or ENCODE_BATCH_SIZE)
+    return {
+        "project": args.project, "papers": len(index.papers), "chunks": len(index),
+        "revision": index.revision, "seconds": round(time.perf_counter() - start, 2)
+    }
+
+def cmd_summarize(args):
+    from summarizer import load_summary_cache, update_summaries, generate_summary, SUMMARY_CONCURRENCY, FLUSH_EVERY
+
+    papers = load_saved_papers(args.project)
+    cache = load_summary_cache(args.project)
+    todo = [p for p in papers if p["id"] not in cache]
+    progress = Progress("summaries", len(todo))
+    unsaved = {}
+    failed = []
+
+    with ThreadPoolExecutor(max_workers=args.workers or SUMMARY_CONCURRENCY) as executor:
+        futures = {executor.submit(generate_summary, p["summary"]): p["id"] for p in todo}
+        for future in as_completed(futures):
+            pid = futures[future]
+            try:
+                unsaved[pid] = future.result()
+                progress.update()
+            except Exception as e:
+                log(f"  {pid}: {e}")
+                failed.append(pid)
+                progress.update(failed=1)
+            # Flushed in small batches so an interrupted run keeps its work
+            if len(unsaved) >= FLUSH_EVERY:
+                update_summaries(unsaved, args.project)
+                unsaved = {}
+    if unsaved:
+        update_summaries(unsaved, args.project)
+    return {"project": args.project, "summarized": len(todo) - len(failed), "already_cached": len(papers) - len(todo), "failed": failed}
+
+def cmd_warm(args):
+    papers = load_saved_papers(args.project)
+    failed = download_and_extract(args.project, papers, args.workers)
+    return {
+        "project": args.project,
+        "failed_pdfs": failed,
+        "index": cmd_index(args),
+        "summaries": cmd_summarize(args)
+    }
+
+def cmd_search(args):
+    from searcher import retrieve_chunks, search_with_semantic_filter
+
+    papers = load_saved_papers(args.project)
+    if args.no_llm:
+        results = retrieve_chunks(args.query, papers, args.project, args.top_k,
+                                  args.lexical_weight, args.all_projects, args.rerank, args.rerank_threshold)
+    else:
+        results = search_with_semantic_filter(args.query, papers, args.project, top_k=args.top_k,
+                                              lexical_weight=args.lexical_weight, all_projects=args.all_projects,
+                                              rerank=args.rerank, rerank_threshold=args.rerank_threshold)
+    return [
+        {
+            "project": r.get("project", args.project),
+            "paper_id": r["paper"]["id"],
+            "title": r["paper"]["title"],
+            "page": r["page"],
+            "score": round(float(r["score"]), 4),
+            "rerank_score": round(r["rerank_score"], 4) if r.get("rerank_score") is not None else None,
+            "answer": r.get("answer"),
+            "chunk": r["chunk"]
+        }
+        for r in results
+    ]
+
+
+#==================== Parser ====================#
+
+def build_parser():
+    from searcher import LEXICAL_WEIGHT, RERANK_THRESHOLD
+
+    parser = argparse.ArgumentParser(prog="cli.py", description="SummarAIze without the web UI")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("list", help="list projects")
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser("ingest", help="add arXiv papers to a project and fetch their PDFs")
+    p.add_argument("project")
+    p.add_argument("ids", nargs="*", help="arXiv IDs or URLs")
+    p.add_argument("--file", help="text or .bib file with arXiv IDs")
+    p.add_argument("--workers", type=int, help="PDF extraction processes")
+    p.add_argument("--skip-pdfs", action="store_true", help="only save the metadata")
+    p.set_defaults(func=cmd_ingest)
+
+    p = sub.add_parser("index", help="build or update the search index")
+    p.add_argument("project")
+    p.add_argument("--batch-size", type=int)
+    p.set_defaults(func=cmd_index)
+
+    p = sub.add_parser("summarize", help="generate missing summaries")
+    p.add_argument("project")
+    p.add_argument("--workers", type=int, help="parallel LLM requests")
+    p.set_defaults(func=cmd_summarize)
+
+    p = sub.add_parser("warm", help="fetch PDFs, index and summarize everything in a project")
+    p.add_argument("project")
+    p.add_argument("--workers", type=int)
+    p.add_argument("--batch-size", type=int)
+    p.set_defaults(func=cmd_warm)
+
+    p = sub.add_parser("search", help="search a project and print JSON")
+    p.add_argument("project")
+    p.add_argument("query")
+    p.add_argument("--top-k", type=int, default=3)
+    p.add_argument("--lexical-weight", type=float, default=LEXICAL_WEIGHT)
+    p.add_argument("--all-projects", action="store_true")
+    p.add_argument("--no-llm", action="store_true", help="return ranked passages without extracted answers")
+    p.add_argument("--rerank", action="store_true", help="rescore a wider pool with the cross-encoder first")
+    p.add_argument("--rerank-threshold", type=float, default=RERANK_THRESHOLD,
+                   help="also drop reranked passages scoring below this (0-1, uncalibrated; off by default)")
+    p.set_defaults(func=cmd_search)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command != "ingest" and getattr(args, "project", None) and not os.path.isdir(get_project_path(args.project)):
+        log(f"No project named '{args.project}'")
+        return 1
+    try:
+        emit(args.func(args))
+    except KeyboardInterrupt:
+        log("Interrupted; finished work is saved, run the same command again to continue.")
+        return 130
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
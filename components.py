@@ -1,9 +1,44 @@
 import streamlit as st
 from utils import *
 from suggester import generate_live_suggestions
-from summarizer import load_summary_cache
-from searcher import search_with_semantic_filter
+from summarizer import load_summary_cache, get_summary_worker
+from searcher import retrieve_chunks, iter_answer_progress, make_result, LEXICAL_WEIGHT
 import hashlib
+import tracing
+
+#==================== Session ====================#
+# Session-state wrappers around the project helpers in utils.py
+
+def delete_paper_by_id(paper_id, state_key="papers"):
+    papers = st.session_state.get(state_key, [])
+    project = st.session_state.get("current_project")
+    updated = delete_paper(paper_id, papers, project) if project else [p for p in papers if p.get("id") != paper_id]
+    st.session_state[state_key] = updated
+    return updated
+
+def add_paper_to_session(paper):
+    added, _ = add_papers_to_project([paper], st.session_state.papers, st.session_state.current_project)
+    return "added" if added else "duplicate"
+
+def add_papers_to_session(papers):
+    return add_papers_to_project(papers, st.session_state.papers, st.session_state.current_project)
+
+def detect_citation_gaps(papers):
+    if has_citation_gaps(papers):
+        st.warning("`Citation IDs have gaps. These will be reused in future additions.`")
+
+def button_setup():
+    button_style = """
+        <style>
+        .stButton > button {
+            width: 100% !important;
+            min-width: 80px;
+            max-width: 100px;
+        }
+        </style>
+    """
+
+    st.markdown(button_style, unsafe_allow_html=True)
 
 #==================== Summary ====================#
 
@@ -18,15 +53,53 @@ def display_summary(paper, summary_cache):
     if summary_data:
         summary_box.markdown(f"**Summary:** {summary_data['summary']}")
         keywords_box.markdown(f"**Keywords:** {summary_data['keywords']}")
-    elif paper_id in st.session_state.generating_summaries:
-        summary_box.markdown("Generating summary...")
-        keywords_box.markdown("Generating keywords...")
     else:
-        # Trigger generation
-        st.session_state.generating_summaries.add(paper_id)
-        summary_box.markdown("Generating summary...")
-        keywords_box.markdown("Generating keywords...")
-        st.rerun()
+        # The background worker fills this in; render_summary_progress reruns
+        # the page once it is saved or has failed, until then the streamed
+        # text is shown.
+        worker = get_summary_worker()
+        project = st.session_state.current_project
+        worker.submit(project, paper_id, paper["summary"])
+        error = worker.get_failure(project, paper_id)
+        if error:
+            summary_box.error(f"Could not generate the summary: {error}")
+            if keywords_box.button("Retry summary", key=f"retry_summary_{paper_id}"):
+                worker.submit(project, paper_id, paper["summary"], retry=True)
+                st.rerun()
+            return
+        with summary_box.container():
+            render_streaming_summary(project, paper_id)
+
+
+@st.fragment(run_every=0.5)
+def render_streaming_summary(project, paper_id):
+    progress = get_summary_worker().get_progress(project, paper_id)
+    if progress is None:
+        st.markdown("Generating summary...")
+        st.markdown("Generating keywords...")
+        return
+    st.markdown(f"**Summary:** {progress['summary']} ▌")
+    st.markdown(f"**Keywords:** {progress['keywords']}")
+
+
+@st.fragment(run_every=2)
+def render_summary_progress(project):
+    worker = get_summary_worker()
+    remaining = worker.pending_count(project)
+    if remaining:
+        st.caption(f"Summarizing {remaining} paper(s) in the background...")
+    failed = worker.failed_count(project)
+    if failed:
+        st.caption(f"{failed} summary(s) failed; they are retried automatically, or open a paper to retry now.")
+
+    # Rerun the whole page only when a new batch of summaries hit the disk
+    version = worker.get_version(project)
+    seen_key = f"summary_version_{project}"
+    if st.session_state.get(seen_key) is None:
+        st.session_state[seen_key] = version
+    elif st.session_state[seen_key] != version:
+        st.session_state[seen_key] = version
+        st.rerun(scope="app")
 
 
 #==================== Logo ====================#
@@ -45,8 +118,7 @@ def render_paper_notes(paper_id, project):
     st.markdown("**Personal Notes**")
     new_note = st.text_area("Add or edit notes below:", value=current, height=150)
     if st.button("Save Notes"):
-        notes[paper_id] = new_note
-        save_notes(notes, project)
+        save_note(paper_id, new_note, project)
         st.success("Notes saved.")
 
 #==================== Card ====================#
@@ -58,6 +130,8 @@ def render_paper_card(paper, summary_cache):
         summary_data = summary_cache.get(paper["id"])
         if summary_data:
             st.caption(summary_data["summary"] or summary_data["keywords"])
+        elif get_summary_worker().get_failure(st.session_state.current_project, paper["id"]):
+            st.caption("Summary failed.")
         else:
             st.caption("Generating summary...")
             
@@ -71,7 +145,6 @@ def render_paper_card(paper, summary_cache):
         if st.session_state.get(delete_key):  # already armed
             if st.button("Confirm", key=f"confirm_{paper['id']}", type="primary"):
                 delete_paper_by_id(paper["id"])
-                save_papers(st.session_state.papers, st.session_state.current_project)
                 st.session_state.pop(delete_key)
                 st.success("Paper deleted.")
                 st.rerun()
@@ -100,6 +173,36 @@ def render_tab_add():
         else:
             st.error("Failed to fetch paper metadata.")
 
+    st.subheader("Bulk Import")
+
+    with st.form("bulk_import_form"):
+        pasted = st.text_area("Paste arXiv URLs or IDs (one per line, or separated by commas):", key="bulk_input")
+        uploaded = st.file_uploader("Or upload a .txt or .bib file", type=["txt", "bib"])
+        imported = st.form_submit_button("Import Papers")
+
+    if imported:
+        text = pasted
+        if uploaded is not None:
+            text += "\n" + uploaded.getvalue().decode("utf-8", errors="ignore")
+
+        arxiv_ids, unrecognized = parse_arxiv_ids(text)
+        if not arxiv_ids:
+            st.error("No arXiv IDs found.")
+            return
+
+        with st.spinner(f"Fetching metadata for {len(arxiv_ids)} paper(s)..."):
+            papers, not_found = fetch_arxiv_metadata_batch(arxiv_ids)
+        added, duplicates = add_papers_to_session(papers)
+
+        if added:
+            st.success(f"Added {len(added)} paper(s) as citations [{added[0]['citation_id']}]–[{added[-1]['citation_id']}]")
+        if duplicates:
+            st.info(f"{len(duplicates)} paper(s) already added.")
+        if not_found:
+            st.warning("Could not fetch these IDs: " + ", ".join(not_found))
+        if unrecognized:
+            st.warning("Not recognized as arXiv IDs: " + ", ".join(unrecognized))
+
 
 
 def render_tab_find():
@@ -108,13 +211,14 @@ def render_tab_find():
     custom_query = st.text_input("Add a specific query to improve suggestions", key="custom_query")
 
     if st.button("Find"):
-        with st.spinner("Thinking..."):
-            project_config = load_project_config(st.session_state.current_project)
+        with st.spinner("Thinking..."), tracing.trace("suggestions") as t:
+            project_config = dict(load_project_config(st.session_state.current_project))
             project_config["custom_query"] = custom_query  # add this line
-            suggestions = generate_live_suggestions(project_config)
+            suggestions = generate_live_suggestions(project_config, st.session_state.current_project)
             st.session_state.temp_suggestions = suggestions
             if len(st.session_state.temp_suggestions) == 0:
                 st.markdown("None found; Try again")
+        st.session_state.last_trace = t
 
     for paper in st.session_state.temp_suggestions:
         st.markdown(f"**{paper['title']}**")
@@ -152,8 +256,8 @@ def render_tab_paper():
         key=lambda p: p.get("citation_id", float("inf"))  # put missing IDs last
     )
 
+    summary_cache = load_summary_cache(st.session_state.current_project)
     for i, paper in enumerate(sorted_papers):
-        summary_cache = load_summary_cache(st.session_state.current_project)
         render_paper_card(paper, summary_cache)
         st.markdown("<hr style='margin: 0.3rem 0;'>", unsafe_allow_html=True)
 
@@ -162,21 +266,100 @@ def render_tab_search():
 
     query = st.text_input("Enter a research question:")
     top_k = st.slider("How many chunks to consider?", min_value=1, max_value=10, value=3)
+    lexical_weight = st.slider(
+        "Keyword match weight", min_value=0.0, max_value=1.0, value=LEXICAL_WEIGHT, step=0.05,
+        help="0 ranks by meaning only; higher values favor exact terms such as dataset names or acronyms."
+    )
+
+    all_projects = st.checkbox("Search all projects", help="Searches every project that has been indexed.")
+    rerank = st.checkbox(
+        "Rerank before answering",
+        help="Rescores a wider pool of candidates with a small cross-encoder and keeps the best ones. "
+             "This changes the order, not the number of LLM calls, unless a minimum relevance is set."
+    )
+    rerank_threshold = st.slider(
+        "Minimum relevance", min_value=0.0, max_value=1.0, value=0.0, step=0.05, disabled=not rerank,
+        help="Skips the LLM for reranked passages scoring below this (the best one is always kept). "
+             "0 keeps all of them. Not calibrated yet; check a value with benchmarks/rerank_eval.py --sweep."
+    )
 
     if st.button("Search"):
-        with st.spinner("Searching through saved papers..."):
-            results = search_with_semantic_filter(
-                query, st.session_state.papers, st.session_state.current_project, top_k=top_k
-            )
+        with tracing.trace("search") as t:
+            render_search_results(query, top_k, lexical_weight, all_projects, rerank, rerank_threshold or None)
+        st.session_state.last_trace = t
 
-        if not results:
-            st.warning("No relevant evidence found.")
-            return
 
-        st.markdown("### Extracted Answers")
-        for res in results:
-            st.markdown(f"**{res['paper']['title']}** — Page {res['page']} (score: {res['score']:.2f})")
-            st.markdown(f"**Answer:** {res['answer']}")
-            if "Not found" not in res['answer']:
-                st.caption(res["chunk"][:700] + "..." if len(res["chunk"]) > 700 else res["chunk"])
-            st.divider()
\ No newline at end of file
+def render_search_results(query, top_k, lexical_weight, all_projects, rerank=False, rerank_threshold=None):
+    with st.spinner("Searching through saved papers..."):
+        chunks = retrieve_chunks(
+            query, st.session_state.papers, st.session_state.current_project, top_k=top_k,
+            lexical_weight=lexical_weight, all_projects=all_projects, rerank=rerank,
+            rerank_threshold=rerank_threshold
+        )
+
+    if not chunks:
+        st.warning("No relevant evidence found.")
+        return
+
+    # Lay out every result first, then fill answers in as tokens arrive
+    st.markdown("### Extracted Answers")
+    answer_boxes = []
+    caption_boxes = []
+    for c in chunks:
+        source = f" [{c.get('project', st.session_state.current_project)}]" if all_projects else ""
+        relevance = f", relevance: {c['rerank_score']:.2f}" if "rerank_score" in c else ""
+        st.markdown(f"**{c['paper']['title']}**{source} — Page {c['page']} (score: {c['score']:.2f}{relevance})")
+        answer_boxes.append(st.empty())
+        caption_boxes.append(st.empty())
+        st.divider()
+
+    for answers, done in iter_answer_progress(query, chunks):
+        for box, answer, finished in zip(answer_boxes, answers, done):
+            box.markdown(f"**Answer:** {answer}" + ("" if finished else " ▌"))
+
+    for box, c, answer in zip(caption_boxes, chunks, answers):
+        res = make_result(c, answer, st.session_state.current_project)
+        if "Not found" not in res['answer']:
+            box.caption(res["chunk"][:700] + "..." if len(res["chunk"]) > 700 else res["chunk"])
+
+
+#==================== Debug ====================#
+
+def render_debug_panel():
+    # Shown when SUMMARAIZE_DEBUG=1; traces and metrics are also written to
+    # tracing.METRICS_DIR for scraping.
+    with st.expander("Performance", expanded=False):
+        last = st.session_state.get("last_trace")
+        if last is not None:
+            data = last.to_dict()
+            st.markdown(f"**Last request:** {data['name']} — {data['duration_ms']:.0f} ms")
+            totals = {}
+            for s in data["spans"]:
+                count, ms = totals.get(s["name"], (0, 0.0))
+                totals[s["name"]] = (count + 1, ms + s["duration_ms"])
+            st.table([
+                {"stage": name, "calls": count, "total ms": round(ms, 1)}
+                for name, (count, ms) in sorted(totals.items(), key=lambda kv: -kv[1][1])
+            ])
+            with st.popover("Spans"):
+                st.json(data["spans"])
+
+        snapshot = tracing.metrics.snapshot()
+        st.markdown("**Stages since start**")
+        st.table([
+            {
+                "stage": name, "calls": stat["count"],
+                "mean ms": round(stat["sum"] / stat["count"] * 1000, 1),
+                "max ms": round(stat["max"] * 1000, 1)
+            }
+            for name, stat in sorted(snapshot["spans"].items())
+        ])
+
+        rates = tracing.metrics.hit_rates()
+        if rates:
+            st.markdown("**Cache hit rates:** " + ", ".join(f"{name} {rate:.0%}" for name, rate in sorted(rates.items())))
+        tokens = {c["name"]: c["value"] for c in snapshot["counters"] if c["name"].endswith("_tokens")}
+        if tokens:
+            st.markdown("**LLM tokens:** " + ", ".join(f"{name} {value}" for name, value in sorted(tokens.items())))
+
+        st.download_button("Download metrics (Prometheus)", tracing.metrics.prometheus_text(), file_name="metrics.prom")
@@ -0,0 +1,88 @@
+import os
+import re
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+CHUNK_SIZE = 64 * 1024
+DOWNLOAD_CONCURRENCY = 4
+DOWNLOAD_TIMEOUT = (5, 60)  # connect, per-read
+HEADERS = {"User-Agent": "SummarAIze/1.0 (research assistant)"}
+
+
+class DownloadError(ValueError):
+    pass
+
+
+#==================== Session ====================#
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(HEADERS)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=DOWNLOAD_CONCURRENCY * 2)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+#==================== Download ====================#
+
+def _expected_total(response, offset):
+    content_range = response.headers.get("Content-Range", "")
+    match = re.match(r"bytes (\d+)-\d+/(\d+)", content_range)
+    if match:
+        return int(match.group(2))
+    length = response.headers.get("Content-Length")
+    return int(length) + offset if length else None
+
+def download_file(url, dest, session=None, timeout=DOWNLOAD_TIMEOUT, content_type="application/pdf", magic=b"%PDF"):
+    # Streams into "<dest>.part" and renames only after the size and content
+    # checks pass, so a crash never leaves a truncated file at dest. A
+    # leftover .part file is resumed with an HTTP Range request.
+    session = session or get_session()
+    part = dest + ".part"
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    r = session.get(url, stream=True, headers=headers, timeout=timeout)
+    with r:
+        if r.status_code == 416 and offset:
+            # Stale partial file; start over
+            os.remove(part)
+            return download_file(url, dest, session, timeout, content_type, magic)
+
+        if r.status_code == 206 and r.headers.get("Content-Range", "").startswith(f"bytes {offset}-"):
+            mode = "ab"
+        elif r.status_code == 200:
+            mode, offset = "wb", 0  # server ignored the Range header
+        else:
+            raise DownloadError(f"Failed to fetch PDF from {url} (HTTP {r.status_code})")
+
+        received_type = r.headers.get("Content-Type", "")
+        if content_type and received_type and content_type not in received_type and "octet-stream" not in received_type:
+            raise DownloadError(f"Expected {content_type} from {url}, got {received_type}")
+
+        expected = _expected_total(r, offset)
+        with open(part, mode) as f:
+            for block in r.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(block)
+
+    size = os.path.getsize(part)
+    if expected is not None and size != expected:
+        # Keep the partial file so the next attempt can resume it
+        raise DownloadError(f"Incomplete download from {url}: {size} of {expected} bytes")
+
+    if magic:
+        with open(part, "rb") as f:
+            if not f.read(len(magic)) == magic:
+                os.remove(part)
+                raise DownloadError(f"Downloaded file from {url} is not a valid PDF")
+
+    os.replace(part, dest)
+    return dest
@@ -0,0 +1,345 @@
+# One process that owns the embedding model and serves the app and CLI
+# processes of the same user. Concurrent encode requests are coalesced into
+# micro-batches: the first request opens a batch, which is encoded when it
+# reaches MAX_BATCH rows, holds a request from every connected client, or
+# MAX_WAIT has passed, whichever comes first.
+#
+#   python embed_server.py [--socket PATH] [--max-batch 64] [--max-wait-ms 5]
+#
+# Opt-in: processes only use the server when SUMMARAIZE_EMBED_SERVER is "on"
+# (the default socket) or a socket path, and load the model in-process
+# otherwise. The server listens on a Unix socket inside a 0700 directory,
+# so only the owner can connect to it or bind in its place, and messages
+# are JSON headers plus raw float32 bytes, never pickles.
+
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import struct
+import argparse
+import threading
+import numpy as np
+import tracing
+
+EMBED_SERVER = os.environ.get("SUMMARAIZE_EMBED_SERVER", "off")   # "on", a socket path, or "off"
+SOCKET_DIR = os.path.join(os.path.expanduser("~"), ".cache", "summaraize", "embed")
+DEFAULT_SOCKET = os.path.join(SOCKET_DIR, "embed.sock")
+MAX_BATCH = 64          # rows per model call
+MAX_WAIT = 0.005        # seconds a batch stays open for more requests
+RETRY_AFTER = 30        # seconds before a client tries the server again after a failure
+MAX_HEADER = 16 * 1024 * 1024
+MAX_PAYLOAD = 256 * 1024 * 1024
+
+
+class EmbedServerError(Exception):
+    pass
+
+
+def socket_path(setting=EMBED_SERVER):
+    # None when the server is disabled
+    if not setting or setting == "off":
+        return None
+    return DEFAULT_SOCKET if setting == "on" else setting
+
+def check_socket_dir(path):
+    # The directory must belong to this user and be closed to everyone else;
+    # otherwise another user could stand in for the server.
+    folder = os.path.dirname(os.path.abspath(path))
+    st = os.stat(folder)
+    if st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise EmbedServerError(f"{folder} must be owned by you and not accessible to others (chmod 700)")
+
+def make_socket_dir(path):
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, mode=0o700, exist_ok=True)
+    check_socket_dir(path)
+
+
+#==================== Framing ====================#
+
+# A frame is: 4-byte header length, 8-byte payload length, JSON header, payload.
+# Vectors travel as the float32 payload with their shape in the header.
+
+def send_frame(sock, header, payload=b""):
+    data = json.dumps(header).encode("utf-8")
+    sock.sendall(struct.pack("!IQ", len(data), len(payload)) + data + payload)
+
+def recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        part = sock.recv(min(n - len(buf), 1 << 20))
+        if not part:
+            raise EOFError("connection closed")
+        buf += part
+    return bytes(buf)
+
+def recv_frame(sock):
+    header_len, payload_len = struct.unpack("!IQ", recv_exact(sock, 12))
+    if header_len > MAX_HEADER or payload_len > MAX_PAYLOAD:
+        raise EmbedServerError("frame too large")
+    header = json.loads(recv_exact(sock, header_len).decode("utf-8"))
+    payload = recv_exact(sock, payload_len) if payload_len else b""
+    return header, payload
+
+def vectors_frame(vectors):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    return {"status": "ok", "shape": list(vectors.shape)}, vectors.tobytes()
+
+def frame_vectors(header, payload):
+    return np.frombuffer(payload, dtype=np.float32).reshape(header["shape"]).copy()
+
+
+#==================== Server ====================#
+
+class Pending:
+    def __init__(self, texts):
+        self.texts = texts
+        self.done = threading.Event()
+        self.vectors = None
+        self.error = None
+
+
+class EmbedServer:
+    def __init__(self, encoder, model_name, path=DEFAULT_SOCKET, max_batch=MAX_BATCH, max_wait=MAX_WAIT):
+        self.encoder = encoder
+        self.model_name = model_name
+        self.path = path
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.sock = None
+        self.connections = 0
+        self._conn_lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def bind(self):
+        make_socket_dir(self.path)
+        if os.path.exists(self.path):
+            # A socket left by a crashed server; refuse to replace a live one
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except OSError:
+                os.unlink(self.path)
+            else:
+                probe.close()
+                raise EmbedServerError(f"An embedding server is already running on {self.path}")
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self.sock.listen(64)
+
+    def serve_forever(self):
+        if self.sock is None:
+            self.bind()
+        threading.Thread(target=self._batch_loop, name="embed-batcher", daemon=True).start()
+        print(f"Embedding server for {self.model_name} on {self.path}", file=sys.stderr, flush=True)
+        try:
+            while not self.stopped.is_set():
+                try:
+                    conn, _ = self.sock.accept()
+                except OSError:
+                    if self.stopped.is_set():
+                        break
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            self.close()
+
+    def stop(self):
+        self.stopped.set()
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def _serve_connection(self, conn):
+        # One thread per client connection; it blocks on its own request
+        # while the batcher thread runs the model for everyone.
+        with self._conn_lock:
+            self.connections += 1
+        try:
+            self._serve_requests(conn)
+        finally:
+            with self._conn_lock:
+                self.connections -= 1
+            conn.close()
+
+    def _serve_requests(self, conn):
+        while True:
+            try:
+                request, _ = recv_frame(conn)
+            except (EOFError, OSError, ValueError, EmbedServerError, struct.error):
+                return
+            command = request.get("cmd")
+            payload = b""
+            if command == "hello":
+                reply = {"status": "ok", "model": self.model_name}
+            elif command == "stats":
+                reply = {"status": "ok", "stats": tracing.metrics.snapshot()}
+            elif command == "encode" and isinstance(request.get("texts"), list) \
+                    and all(isinstance(t, str) for t in request["texts"]):
+                pending = Pending(request["texts"])
+                self.queue.put(pending)
+                pending.done.wait()
+                if pending.error:
+                    reply = {"status": "error", "error": pending.error}
+                else:
+                    reply, payload = vectors_frame(pending.vectors)
+            else:
+                reply = {"status": "error", "error": f"Bad request: {command}"}
+            try:
+                send_frame(conn, reply, payload)
+            except OSError:
+                return
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        rows = len(batch[0].texts)
+        deadline = time.perf_counter() + self.max_wait
+        # No point waiting once every connected client is in the batch
+        while rows < self.max_batch and len(batch) < self.connections:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                pending = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(pending)
+            rows += len(pending.texts)
+        return batch, rows
+
+    def _batch_loop(self):
+        while True:
+            batch, rows = self._collect()
+            texts = [text for pending in batch for text in pending.texts]
+            try:
+                with tracing.span("embed_batch", rows=rows, requests=len(batch)):
+                    vectors = np.asarray(self.encoder.encode(texts), dtype=np.float32) if texts else None
+            except Exception as e:
+                for pending in batch:
+                    pending.error = f"Error: {e}"
+                    pending.done.set()
+                continue
+            tracing.count("embed_batches")
+            tracing.count("embed_requests", len(batch))
+            tracing.count("embed_rows", rows)
+            offset = 0
+            for pending in batch:
+                n = len(pending.texts)
+                pending.vectors = vectors[offset:offset + n] if n else np.zeros((0, 0), dtype=np.float32)
+                offset += n
+                pending.done.set()
+
+
+#==================== Client ====================#
+
+class RemoteEncoder:
+    # Drop-in for the model's encode(): a str gives one vector, a list gives
+    # a matrix. Every thread keeps its own connection. If the server goes
+    # away, encoding continues on the local model until RETRY_AFTER passes.
+    def __init__(self, path, fallback):
+        self.path = path
+        self.fallback = fallback
+        self._local = threading.local()
+        self._down_until = 0.0
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            check_socket_dir(self.path)
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                conn.connect(self.path)
+            except OSError:
+                conn.close()
+                raise
+            self._local.conn = conn
+        return conn
+
+    def _request(self, header):
+        conn = self._connection()
+        try:
+            send_frame(conn, header)
+            reply, payload = recv_frame(conn)
+        except (OSError, EOFError, ValueError, EmbedServerError, struct.error):
+            self._local.conn = None
+            conn.close()
+            raise EmbedServerError("embedding server connection failed")
+        if reply.get("status") != "ok":
+            raise RuntimeError(reply.get("error", "embedding server error"))
+        return reply, payload
+
+    def encode(self, texts, **kwargs):
+        single = isinstance(texts, str)
+        if time.monotonic() < self._down_until:
+            return self.fallback().encode(texts, **kwargs)
+        try:
+            reply, payload = self._request({"cmd": "encode", "texts": [texts] if single else list(texts)})
+            vectors = frame_vectors(reply, payload)
+        except (OSError, EmbedServerError, KeyError, ValueError) as e:
+            print(f"Embedding server unavailable, encoding locally: {e}", file=sys.stderr)
+            self._down_until = time.monotonic() + RETRY_AFTER
+            return self.fallback().encode(texts, **kwargs)
+        return vectors[0] if single else vectors
+
+    def stats(self):
+        return self._request({"cmd": "stats"})[0]["stats"]
+
+
+def connect(model_name, fallback, setting=EMBED_SERVER):
+    # A RemoteEncoder if the server is enabled and runs the same model,
+    # else None. Vectors from another model would not match the stored indexes.
+    path = socket_path(setting)
+    if path is None:
+        return None
+    if not hasattr(socket, "AF_UNIX"):
+        print("The embedding server needs Unix sockets; encoding locally", file=sys.stderr)
+        return None
+    encoder = RemoteEncoder(path, fallback)
+    try:
+        info, _ = encoder._request({"cmd": "hello"})
+    except (OSError, EmbedServerError, RuntimeError) as e:
+        print(f"Embedding server not reachable ({e}); encoding locally", file=sys.stderr)
+        return None
+    if info.get("model") != model_name:
+        print(f"Embedding server runs {info.get('model')}, not {model_name}; encoding locally", file=sys.stderr)
+        return None
+    return encoder
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared embedding model with micro-batching")
+    parser.add_argument("--socket", default=socket_path() or DEFAULT_SOCKET,
+                        help="Unix socket path; its folder must be private to you")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT * 1000)
+    args = parser.parse_args()
+
+    from searcher import load_local_model, EMBEDDING_MODEL
+    server = EmbedServer(load_local_model(), EMBEDDING_MODEL, args.socket, args.max_batch, args.max_wait_ms / 1000)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+    except EmbedServerError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+PAGES_PER_TASK = 16
+EXTRACT_WORKERS = os.cpu_count() or 1
+
+
+#==================== Workers ====================#
+
+def _extract_page_range(pdf_path, start, end):
+    # Runs in a worker process; each task opens its own document handle
+    import fitz
+    with fitz.open(pdf_path) as doc:
+        return {str(i + 1): doc[i].get_text() for i in range(start, end)}
+
+def _page_count(pdf_path):
+    import fitz
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+#==================== Pool ====================#
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+def get_pool(max_workers=EXTRACT_WORKERS):
+    # One pool per process, created on first use and shared by every
+    # session. Workers are started with forkserver (spawn where that is not
+    # available): forking the threaded app process can copy a lock held by
+    # another thread (torch, MuPDF, the summary worker) and deadlock the child.
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != max_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+            _pool_workers = max_workers
+        return _pool
+
+def _discard_pool(pool):
+    # A worker died (e.g. MuPDF crashed); the next call starts a fresh pool
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+#==================== Extraction ====================#
+
+def extract_pdf_texts(pdf_paths, max_workers=EXTRACT_WORKERS, pages_per_task=PAGES_PER_TASK):
+    # Returns {pdf_path: text_by_page or the exception that stopped it}.
+    # Work is split across papers and across page ranges of large PDFs.
+    results = {}
+    tasks = []
+    for path in pdf_paths:
+        try:
+            count = _page_count(path)
+        except Exception as e:
+            results[path] = e
+            continue
+        results[path] = {}
+        for start in range(0, count, pages_per_task):
+            tasks.append((path, start, min(start + pages_per_task, count)))
+
+    if len(tasks) <= 1 or max_workers <= 1:
+        parts = []
+        for task in tasks:
+            try:
+                parts.append(_extract_page_range(*task))
+            except Exception as e:
+                parts.append(e)
+    else:
+        pool = get_pool(max_workers)
+        try:
+            futures = [pool.submit(_extract_page_range, *task) for task in tasks]
+        except BrokenProcessPool as e:
+            _discard_pool(pool)
+            futures = []
+            parts = [e] * len(tasks)
+        else:
+            parts = []
+        for future in futures:
+            try:
+                parts.append(future.result())
+            except BrokenProcessPool as e:
+                _discard_pool(pool)
+                parts.append(e)
+            except Exception as e:
+                parts.append(e)
+
+    # Tasks are in page order, so merging keeps text_by_page ordered too
+    for (path, _, _), part in zip(tasks, parts):
+        if isinstance(results[path], Exception):
+            continue
+        if isinstance(part, Exception):
+            results[path] = part
+        else:
+            results[path].update(part)
+    return results
+
+def extract_pdf_text(pdf_path, max_workers=EXTRACT_WORKERS, pages_per_task=PAGES_PER_TASK):
+    result = extract_pdf_texts([pdf_path], max_workers, pages_per_task)[pdf_path]
+    if isinstance(result, Exception):
+        raise result
+    return result
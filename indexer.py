@@ -0,0 +1,305 @@
+import os
+import json
+import uuid
+import threading
+import numpy as np
+from utils import get_project_path, get_text_cache, ingest_papers, content_key
+from sharedstore import get_shared_store
+import tracing
+from chunker import chunk_pages, chunker_settings
+
+INDEX_DIR = "index"
+EMBEDDINGS_FILE = "embeddings.npy"
+META_FILE = "meta.json"
+REVISION_FILE = "revision"
+INDEX_VERSION = 4
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+ENCODE_BATCH_SIZE = 64
+
+
+#==================== Paths ====================#
+
+def get_index_path(project):
+    folder = os.path.join(get_project_path(project), INDEX_DIR)
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+#==================== Signatures ====================#
+
+def cache_signature(paper, project):
+    # Changes whenever the cached page text is rewritten
+    return get_text_cache(project).signature(content_key(paper))
+
+def embedding_signature(signature):
+    # Shared embeddings outlive any one project index, so they also record
+    # how the chunks were cut and which model encoded them
+    return f"{signature}|v{INDEX_VERSION}|{EMBEDDING_MODEL}|{chunker_settings()}"
+
+
+#==================== Scoring ====================#
+
+def normalize_rows(vectors):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def encode_in_batches(encode, texts, batch_size=ENCODE_BATCH_SIZE):
+    # Fill one preallocated matrix so peak memory is a single batch of
+    # model output on top of the final result.
+    matrix = None
+    tracing.count("encoded_chunks", len(texts))
+    for start in range(0, len(texts), batch_size):
+        with tracing.span("encode", rows=len(texts[start:start + batch_size])):
+            batch = normalize_rows(encode(texts[start:start + batch_size]))
+        if matrix is None:
+            matrix = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+        matrix[start:start + len(batch)] = batch
+    return matrix
+
+def top_k_rows(matrix, query_vec, top_k):
+    # Rows are unit length, so one mat-vec product gives cosine similarity
+    # and argpartition keeps the selection O(n) instead of a full sort.
+    if matrix is None or len(matrix) == 0 or top_k <= 0:
+        return [], []
+    scores = matrix @ normalize_rows(query_vec)
+    if top_k < len(scores):
+        rows = np.argpartition(scores, -top_k)[-top_k:]
+    else:
+        rows = np.arange(len(scores))
+    rows = rows[np.argsort(scores[rows])[::-1]]
+    return rows, scores[rows]
+
+
+#==================== Index ====================#
+
+class ChunkIndex:
+    def __init__(self, project):
+        self.project = project
+        self.papers = {}        # paper_id -> {"signature": [...], "rows": n}
+        self.chunks = []        # row -> {"paper_id", "page", "start", "end", "chunk"}
+        self.embeddings = None  # (rows, dim) float32, rows unit length
+        self.revision = None    # changes on every save, used by derived indexes
+        self._starts = None
+
+    @classmethod
+    def load(cls, project):
+        index = cls(project)
+        folder = get_index_path(project)
+        meta_path = os.path.join(folder, META_FILE)
+        emb_path = os.path.join(folder, EMBEDDINGS_FILE)
+        if not (os.path.exists(meta_path) and os.path.exists(emb_path)):
+            return index
+
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            embeddings = np.load(emb_path)
+        except (OSError, ValueError) as e:
+            print("Discarding unreadable index:", e)
+            return index
+
+        if meta.get("version") != INDEX_VERSION or meta.get("model") != EMBEDDING_MODEL \
+                or meta.get("chunker") != chunker_settings() or len(meta.get("chunks", [])) != len(embeddings):
+            return index
+
+        index.papers = meta["papers"]
+        index.chunks = meta["chunks"]
+        index.embeddings = embeddings
+        index.revision = meta.get("revision")
+        return index
+
+    def save(self):
+        folder = get_index_path(self.project)
+        self.revision = uuid.uuid4().hex
+        meta = {
+            "version": INDEX_VERSION, "model": EMBEDDING_MODEL, "chunker": chunker_settings(),
+            "revision": self.revision, "papers": self.papers, "chunks": self.chunks
+        }
+
+        # Write to temp files first so a crash never leaves a half-written index
+        emb_tmp = os.path.join(folder, EMBEDDINGS_FILE + ".tmp")
+        meta_tmp = os.path.join(folder, META_FILE + ".tmp")
+        with open(emb_tmp, "wb") as f:
+            np.save(f, self.embeddings if self.embeddings is not None else np.zeros((0, 0), dtype=np.float32))
+        with open(meta_tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(emb_tmp, os.path.join(folder, EMBEDDINGS_FILE))
+        os.replace(meta_tmp, os.path.join(folder, META_FILE))
+        # Small side file so other indexes can check for changes cheaply
+        with open(os.path.join(folder, REVISION_FILE), "w") as f:
+            f.write(self.revision)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def copy(self):
+        # Updates run on a copy so searches holding the cached index never
+        # see it half-changed; embeddings are replaced, never written to.
+        other = ChunkIndex(self.project)
+        other.papers = dict(self.papers)
+        other.chunks = list(self.chunks)
+        other.embeddings = self.embeddings
+        other.revision = self.revision
+        return other
+
+    def paper_starts(self):
+        # Row of each paper's first chunk. A paper's rows are contiguous and
+        # papers keep the order their rows were added in.
+        if self._starts is None:
+            starts, row = {}, 0
+            for pid, entry in self.papers.items():
+                starts[pid] = row
+                row += entry["rows"]
+            self._starts = starts
+        return self._starts
+
+    def remove_papers(self, paper_ids):
+        paper_ids = set(paper_ids) & set(self.papers)
+        if not paper_ids:
+            return False
+
+        keep = [i for i, c in enumerate(self.chunks) if c["paper_id"] not in paper_ids]
+        self.chunks = [self.chunks[i] for i in keep]
+        if self.embeddings is not None:
+            self.embeddings = np.ascontiguousarray(self.embeddings[keep])
+        for pid in paper_ids:
+            del self.papers[pid]
+        self._starts = None
+        return True
+
+    def add_papers(self, entries, encode, batch_size=ENCODE_BATCH_SIZE):
+        # entries: [(paper, pages, signature)]. Papers another project has
+        # already embedded are copied from the shared store; the rest are
+        # encoded together so small papers still fill whole batches.
+        shared = get_shared_store()
+        self._starts = None
+        rows = []
+        parts = []      # per paper: [key, signature, chunks, vectors or None]
+        for paper, pages, signature in entries:
+            key = content_key(paper)
+            cached = shared.load_embeddings(key, embedding_signature(signature))
+            tracing.count("shared_embeddings", result="miss" if cached is None else "hit")
+            chunks, vectors = cached if cached is not None else (chunk_pages(pages), None)
+            parts.append([key, embedding_signature(signature), chunks, vectors])
+            rows.extend(dict(chunk, paper_id=paper["id"]) for chunk in chunks)
+            self.papers[paper["id"]] = {"signature": signature, "rows": len(chunks)}
+
+        if not rows:
+            return
+
+        todo = [p for p in parts if p[3] is None and p[2]]
+        texts = [c["chunk"] for p in todo for c in p[2]]
+        if texts:
+            encoded = encode_in_batches(encode, texts, batch_size)
+            offset = 0
+            for part in todo:
+                part[3] = encoded[offset:offset + len(part[2])]
+                offset += len(part[2])
+                shared.save_embeddings(part[0], part[1], part[2], part[3])
+
+        vectors = np.concatenate([p[3] for p in parts if p[2]]).astype(np.float32, copy=False)
+        if self.embeddings is None or len(self.embeddings) == 0:
+            self.embeddings = vectors
+        else:
+            self.embeddings = np.concatenate([self.embeddings, vectors])
+        self.chunks.extend(rows)
+
+    def search(self, query_vec, top_k):
+        rows, scores = top_k_rows(self.embeddings, query_vec, top_k)
+        return [(self.chunks[row], float(score)) for row, score in zip(rows, scores)]
+
+    def score_rows(self, query_vec, rows):
+        # Dense scores for a candidate subset only
+        return self.embeddings[rows] @ normalize_rows(query_vec)
+
+    def sync(self, papers, encode, batch_size=ENCODE_BATCH_SIZE):
+        # Drop papers that left the project or whose page text changed,
+        # then embed only the papers that are missing from the index.
+        changed = False
+        wanted = {p["id"]: p for p in papers}
+
+        stale = [pid for pid in self.papers if pid not in wanted]
+        for pid, paper in wanted.items():
+            entry = self.papers.get(pid)
+            if entry and entry["signature"] != cache_signature(paper, self.project):
+                stale.append(pid)
+        changed |= self.remove_papers(stale)
+
+        # Download and extract all new papers in one parallel ingestion pass
+        missing = [p for pid, p in wanted.items() if pid not in self.papers]
+        pages_by_id = ingest_papers(missing, self.project) if missing else {}
+
+        entries = []
+        for paper in missing:
+            pages = pages_by_id[paper["id"]]
+            if isinstance(pages, Exception):
+                print(f"Skipping {paper['id']} in index:", pages)
+                continue
+            entries.append((paper, pages, cache_signature(paper, self.project)))
+
+        if entries:
+            self.add_papers(entries, encode, batch_size)
+            changed = True
+
+        if changed:
+            self.save()
+        return changed
+
+
+#==================== Helpers ====================#
+
+def read_index_revision(project):
+    path = os.path.join(get_project_path(project), INDEX_DIR, REVISION_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return f.read().strip()
+
+#==================== Shared Instances ====================#
+
+_indexes = {}           # project -> ChunkIndex, treated as read-only
+_indexes_lock = threading.Lock()
+_sync_locks = {}        # project -> lock held while its index is updated
+
+def _sync_lock(project):
+    with _indexes_lock:
+        return _sync_locks.setdefault(project, threading.Lock())
+
+def get_chunk_index(project):
+    # Kept in memory across queries and revalidated with the small revision
+    # file, so an unchanged index is not re-read from disk. Callers must not
+    # modify the returned index; copy() it first.
+    revision = read_index_revision(project)
+    with _indexes_lock:
+        index = _indexes.get(project)
+    if index is not None and revision is not None and index.revision == revision:
+        return index
+    index = ChunkIndex.load(project)
+    with _indexes_lock:
+        _indexes[project] = index
+    return index
+
+def _replace_index(project, index):
+    with _indexes_lock:
+        _indexes[project] = index
+
+def load_synced_index(project, papers, encode, batch_size=ENCODE_BATCH_SIZE):
+    with tracing.span("index_sync", papers=len(papers)):
+        with _sync_lock(project):
+            cached = get_chunk_index(project)
+            index = cached.copy()
+            if not index.sync(papers, encode, batch_size):
+                return cached
+            _replace_index(project, index)
+    return index
+
+def remove_papers_from_index(project, paper_ids):
+    if not project:
+        return
+    with _sync_lock(project):
+        index = get_chunk_index(project).copy()
+        if index.remove_papers(paper_ids):
+            index.save()
+            _replace_index(project, index)
@@ -0,0 +1,141 @@
+import os
+import re
+import threading
+import numpy as np
+from collections import Counter
+
+BM25_FILE = "bm25.npz"
+K1 = 1.5
+B = 0.75
+
+# Keeps identifiers such as "resnet-50", "gpt-3.5" or "f1_score" whole, and
+# also indexes their parts so "resnet" alone still matches.
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+STOPWORDS = set("""
+a an and are as at be by can do does for from has have how in into is it its
+of on or our that the their them these this those to was we were what when
+where which while who why will with
+""".split())
+
+
+def tokenize(text):
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        parts = re.split(r"[-_.]", token)
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p and p not in STOPWORDS)
+    return tokens
+
+
+#==================== Index ====================#
+
+class BM25Index:
+    # Inverted index in CSR form: the postings of vocab[i] are
+    # rows[offsets[i]:offsets[i + 1]] with matching term frequencies.
+    def __init__(self, vocab, offsets, rows, tfs, doc_len, revision=None):
+        self.vocab = {term: i for i, term in enumerate(vocab)}
+        self.terms = vocab
+        self.offsets = offsets
+        self.rows = rows
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.avgdl = float(doc_len.mean()) if len(doc_len) else 0.0
+        self.revision = revision
+
+    @classmethod
+    def build(cls, texts, revision=None):
+        postings = {}
+        doc_len = np.zeros(len(texts), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_len[row] = sum(counts.values())
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((row, tf))
+
+        vocab = sorted(postings)
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        for i, term in enumerate(vocab):
+            offsets[i + 1] = offsets[i] + len(postings[term])
+        rows = np.empty(offsets[-1], dtype=np.int32)
+        tfs = np.empty(offsets[-1], dtype=np.float32)
+        for i, term in enumerate(vocab):
+            entries = postings[term]
+            rows[offsets[i]:offsets[i + 1]] = [r for r, _ in entries]
+            tfs[offsets[i]:offsets[i + 1]] = [tf for _, tf in entries]
+        return cls(vocab, offsets, rows, tfs, doc_len, revision)
+
+    @classmethod
+    def load(cls, folder):
+        path = os.path.join(folder, BM25_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            data = np.load(path, allow_pickle=False)
+            return cls(
+                list(data["vocab"]), data["offsets"], data["rows"], data["tfs"],
+                data["doc_len"], str(data["revision"])
+            )
+        except (OSError, ValueError, KeyError) as e:
+            print("Discarding unreadable BM25 index:", e)
+            return None
+
+    def save(self, folder):
+        tmp = os.path.join(folder, BM25_FILE + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f, vocab=np.array(self.terms, dtype=str), offsets=self.offsets, rows=self.rows,
+                tfs=self.tfs, doc_len=self.doc_len, revision=np.array(self.revision or "")
+            )
+        os.replace(tmp, os.path.join(folder, BM25_FILE))
+
+    def search(self, query, limit):
+        # Returns (rows, scores) for the best `limit` chunks containing at
+        # least one query term, best first. Only postings are touched.
+        n = len(self.doc_len)
+        hit_rows = []
+        hit_scores = []
+        for term in set(tokenize(query)):
+            i = self.vocab.get(term)
+            if i is None:
+                continue
+            rows = self.rows[self.offsets[i]:self.offsets[i + 1]]
+            tfs = self.tfs[self.offsets[i]:self.offsets[i + 1]]
+            idf = np.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = tfs + K1 * (1 - B + B * self.doc_len[rows] / self.avgdl)
+            hit_rows.append(rows)
+            hit_scores.append(idf * tfs * (K1 + 1) / norm)
+
+        if not hit_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        # Sum per-term scores of chunks that match several terms
+        rows, inverse = np.unique(np.concatenate(hit_rows), return_inverse=True)
+        values = np.bincount(inverse, weights=np.concatenate(hit_scores)).astype(np.float32)
+        if limit < len(rows):
+            keep = np.argpartition(values, -limit)[-limit:]
+            rows, values = rows[keep], values[keep]
+        order = np.argsort(values)[::-1]
+        return rows[order], values[order]
+
+
+#==================== Helpers ====================#
+
+_cached = {}    # folder -> BM25Index of the last chunk index revision seen
+_cached_lock = threading.Lock()
+
+def load_bm25(index, folder):
+    # Kept in memory per index folder; read from disk, or rebuilt from the
+    # chunk index, only when the chunk index revision changes
+    with _cached_lock:
+        bm25 = _cached.get(folder)
+    if bm25 is not None and bm25.revision == index.revision:
+        return bm25
+    bm25 = BM25Index.load(folder)
+    if bm25 is None or bm25.revision != index.revision:
+        bm25 = BM25Index.build([c["chunk"] for c in index.chunks], index.revision)
+        bm25.save(folder)
+    with _cached_lock:
+        _cached[folder] = bm25
+    return bm25
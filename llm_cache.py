@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+CACHE_DIR = os.environ.get("SUMMARAIZE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "summaraize"))
+CACHE_FILE = "llm_cache.sqlite3"
+MAX_ENTRIES = 20000
+MAX_BYTES = 200 * 1024 * 1024
+MAX_AGE_DAYS = 30
+EVICT_EVERY = 100   # puts between eviction passes
+
+
+def make_key(prompt, model, options=None):
+    payload = json.dumps({"model": model, "options": options or {}, "prompt": prompt}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+#==================== Cache ====================#
+
+class ResponseCache:
+    def __init__(self, path=None, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, max_age_days=MAX_AGE_DAYS):
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, CACHE_FILE)
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                size INTEGER,
+                created REAL,
+                accessed REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed)")
+        self.conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, model, response):
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode()), now, now)
+            )
+            self.conn.commit()
+            self._puts += 1
+            if self._puts % EVICT_EVERY == 0:
+                self._evict()
+
+    def _evict(self):
+        # Expired rows first, then least recently used until under both limits
+        self.conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age,))
+        count, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count > self.max_entries or total > self.max_bytes:
+            excess_bytes = total - self.max_bytes
+            excess_rows = count - self.max_entries
+            removed_rows = removed_bytes = 0
+            stale = []
+            for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC"):
+                if removed_rows >= excess_rows and removed_bytes >= excess_bytes:
+                    break
+                stale.append((key,))
+                removed_rows += 1
+                removed_bytes += size
+            self.conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+        self.conn.commit()
+
+    def evict(self):
+        with self._lock:
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+
+    def stats(self):
+        with self._lock:
+            count, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": count,
+            "bytes": total
+        }
+
+
+#==================== Shared Instance ====================#
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+import tracing
+
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+DEFAULT_MODEL = "llama3"
+DEFAULT_TIMEOUT = 120       # seconds to wait for a full generation, or between streamed tokens
+CONNECT_TIMEOUT = 3
+DEFAULT_RETRIES = 2
+POOL_SIZE = 8
+
+
+class OllamaError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+#==================== Client ====================#
+
+class OllamaClient:
+    def __init__(self, host=OLLAMA_HOST, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, pool_size=POOL_SIZE):
+        if not host.startswith("http"):
+            host = f"http://{host}"
+        self.host = host.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+
+        # One keep-alive pool shared by every caller in the process
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, path, payload, timeout=None, stream=False):
+        timeout = timeout or self.timeout
+        last_error = None
+
+        for attempt in range(self.retries + 1):
+            try:
+                r = self.session.post(
+                    f"{self.host}{path}",
+                    json=payload,
+                    timeout=(CONNECT_TIMEOUT, timeout),
+                    stream=stream
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = OllamaError(f"Ollama request failed: {e}")
+            else:
+                if r.status_code == 200:
+                    return r
+                last_error = OllamaError(self._error_message(r), status=r.status_code)
+                # Client errors (unknown model, bad options) will not fix themselves
+                if r.status_code < 500:
+                    break
+
+            if attempt < self.retries:
+                time.sleep(0.5 * 2 ** attempt)
+
+        raise last_error
+
+    @staticmethod
+    def _error_message(response):
+        try:
+            return response.json().get("error", response.text)
+        except ValueError:
+            return response.text or f"HTTP {response.status_code}"
+
+    def generate(self, prompt, model=DEFAULT_MODEL, options=None, timeout=None):
+        payload = {"model": model, "prompt": prompt, "stream": False}
+        if options:
+            payload["options"] = options
+        r = self._post("/api/generate", payload, timeout=timeout)
+        data = r.json()
+        self._count_tokens(data, model)
+        return data.get("response", "")
+
+    def generate_stream(self, prompt, model=DEFAULT_MODEL, options=None, timeout=None):
+        # Yields text pieces as Ollama produces them. Retries only cover the
+        # request itself; once tokens flow, a broken stream raises.
+        payload = {"model": model, "prompt": prompt, "stream": True}
+        if options:
+            payload["options"] = options
+        r = self._post("/api/generate", payload, timeout=timeout, stream=True)
+        try:
+            # chunk_size=None hands lines over as they arrive instead of
+            # waiting for a full read buffer
+            for line in r.iter_lines(chunk_size=None):
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise OllamaError(data["error"])
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    self._count_tokens(data, model)
+                    break
+        except requests.RequestException as e:
+            raise OllamaError(f"Ollama stream interrupted: {e}")
+        finally:
+            r.close()
+
+    @staticmethod
+    def _count_tokens(data, model):
+        # Ollama reports token counts on the final response object
+        tracing.count("llm_prompt_tokens", data.get("prompt_eval_count", 0), model=model)
+        tracing.count("llm_output_tokens", data.get("eval_count", 0), model=model)
+
+    def list_models(self):
+        r = self.session.get(f"{self.host}/api/tags", timeout=(CONNECT_TIMEOUT, 10))
+        if r.status_code != 200:
+            raise OllamaError(self._error_message(r), status=r.status_code)
+        return [m["name"] for m in r.json().get("models", [])]
+
+
+#==================== Shared Instance ====================#
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient()
+        return _client
@@ -0,0 +1,61 @@
+import os
+import json
+import threading
+
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+#==================== Store ====================#
+
+class ProjectStore:
+    # Keeps parsed project JSON files in memory and revalidates them with a
+    # single stat() per read. Returned objects are shared with the cache and
+    # every session, so callers copy them before making changes.
+    def __init__(self):
+        self._entries = {}   # path -> (signature, data)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load_json(self, path, default=None):
+        sig = file_signature(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if sig is not None and entry is not None and entry[0] == sig:
+                self.hits += 1
+                return entry[1]
+
+        self.misses += 1
+        if sig is None:
+            return default() if callable(default) else default
+        with open(path, "r") as f:
+            data = json.load(f)
+        with self._lock:
+            self._entries[path] = (sig, data)
+        return data
+
+    def save_json(self, path, data, indent=2):
+        text = json.dumps(data, indent=indent)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+        # Cache what was written, not the caller's object, which it may
+        # keep editing before the next save
+        with self._lock:
+            self._entries[path] = (file_signature(path), json.loads(text))
+
+    def invalidate(self, prefix=""):
+        with self._lock:
+            for path in [p for p in self._entries if p.startswith(prefix)]:
+                del self._entries[path]
+
+
+# One store per process, shared by app.py, components.py and summarizer.py
+project_store = ProjectStore()
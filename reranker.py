@@ -0,0 +1,58 @@
+# Optional second stage for the Search tab: a small cross-encoder reads the
+# question and each retrieved passage together and rescores them, so the
+# LLM only sees the best passages out of a wider pool.
+
+import threading
+import numpy as np
+import tracing
+
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_POOL = 4             # candidates retrieved per requested chunk
+MAX_CANDIDATES = 40
+# Minimum sigmoid score a passage needs to reach the LLM. Not calibrated for
+# RERANK_MODEL yet (see benchmarks/rerank_eval.py --sweep), so by default
+# nothing is dropped and reranking only picks the best top_k.
+RERANK_THRESHOLD = None
+RERANK_BATCH_SIZE = 32
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker():
+    # Loaded on first use like the embedding model; about 90 MB on CPU
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            import torch
+            from sentence_transformers import CrossEncoder
+            _reranker = CrossEncoder(RERANK_MODEL, device="cpu", activation_fn=torch.nn.Sigmoid())
+        return _reranker
+
+
+def candidate_count(top_k, pool=RERANK_POOL):
+    return min(max(top_k * pool, top_k), MAX_CANDIDATES)
+
+
+def rerank(query, chunks, top_k, threshold=RERANK_THRESHOLD, min_keep=1, model=None):
+    # chunks as returned by find_relevant_chunks. Returns at most top_k of
+    # them, best first, each with a "rerank_score". With a threshold, chunks
+    # under it are dropped, but the best min_keep are always kept so a
+    # strict threshold never leaves the search empty.
+    if not chunks:
+        return []
+    model = model or get_reranker()
+    with tracing.span("rerank", candidates=len(chunks)):
+        scores = np.asarray(model.predict(
+            [(query, c["chunk"]) for c in chunks], batch_size=RERANK_BATCH_SIZE, show_progress_bar=False
+        ), dtype=np.float32).reshape(-1)
+
+    order = np.argsort(-scores, kind="stable")[:top_k]
+    kept = [
+        {**chunks[i], "rerank_score": float(scores[i])}
+        for rank, i in enumerate(order)
+        if threshold is None or rank < min_keep or scores[i] >= threshold
+    ]
+    tracing.count("rerank_kept", len(kept))
+    tracing.count("rerank_dropped", len(chunks) - len(kept))
+    return kept
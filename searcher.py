@@ -1,39 +1,173 @@
 # searcher.py
 
+import os
 import re
-from typing import List, Dict
-from utils import extract_and_cache_pdf_text, run_llama_prompt
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
+from utils import run_llama_prompt, stream_llama_prompt, load_saved_papers
+from indexer import get_chunk_index, load_synced_index, get_index_path, ENCODE_BATCH_SIZE, EMBEDDING_MODEL
+from ann import search_synced, NPROBE
+from lexical import load_bm25
+from reranker import rerank as rerank_chunks, candidate_count, RERANK_THRESHOLD
+import tracing
+import embed_server
+import time
+import threading
+import types
 import numpy as np
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
+_model = None
+_model_lock = threading.Lock()
+_local_model = None
+_local_model_lock = threading.Lock()
 
 
-def find_relevant_chunks(query: str, papers: List[dict], project: str, top_k: int = 3):
-    query_vec = model.encode(query)
-    candidates = []
+def load_local_model():
+    # Loaded on first use and shared by every Streamlit session and rerun
+    # in the process, so opening the app never pays for torch up front.
+    global _local_model
+    with _local_model_lock:
+        if _local_model is None:
+            import torch
+            from sentence_transformers import SentenceTransformer
 
-    for paper in papers:
-        pages = extract_and_cache_pdf_text(paper, project)
-        for page_num, text in pages.items():
-            chunks = [chunk.strip() for chunk in text.split("\n\n") if len(chunk.strip()) > 50]
-            for chunk in chunks:
-                chunk_vec = model.encode(chunk)
-                score = cosine_similarity([query_vec], [chunk_vec])[0][0]
-                candidates.append({
-                    "score": score,
-                    "chunk": chunk,
-                    "paper": paper,
-                    "page": page_num
-                })
+            # Patch to avoid torch.classes introspection error with Streamlit
+            if not hasattr(torch, "classes"):
+                torch.classes = types.SimpleNamespace()
+            setattr(torch.classes, "__path__", [])
 
-    top_chunks = sorted(candidates, key=lambda x: x["score"], reverse=True)[:top_k]
-    return top_chunks
+            _local_model = SentenceTransformer(EMBEDDING_MODEL)
+        return _local_model
 
 
-def llama_extract_answer(query: str, chunk: str, paper: dict, page: int):
-    prompt = f"""
+def get_model():
+    # The shared embedding server when one is running (see embed_server.py),
+    # so processes do not each hold a copy of the model and concurrent
+    # queries are batched together; the in-process model otherwise.
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = embed_server.connect(EMBEDDING_MODEL, load_local_model) or load_local_model()
+        return _model
+
+# Match the number of requests the Ollama server runs in parallel
+LLM_CONCURRENCY = int(os.environ.get("OLLAMA_NUM_PARALLEL", 4))
+
+# Share of the BM25 score in hybrid ranking (0 = dense only), and how many
+# lexical candidates get dense-scored
+LEXICAL_WEIGHT = 0.3
+CANDIDATE_POOL = 200
+
+
+def hybrid_search(index, bm25, query: str, query_vec, top_k: int, lexical_weight: float, candidate_pool: int):
+    # Returns [(chunk, score)]. BM25 proposes candidates first; when it finds
+    # enough of them, dense scores are computed for that pool only and the
+    # two are fused as (1 - w) * cosine + w * normalized BM25. Otherwise
+    # fall back to the full dense scan, still boosted by any lexical hits.
+    if lexical_weight <= 0:
+        return index.search(query_vec, top_k)
+
+    lex_rows, lex_scores = bm25.search(query, candidate_pool)
+    if len(lex_rows) == 0:
+        return index.search(query_vec, top_k)
+    lex_norm = lex_scores / lex_scores.max()
+
+    if len(lex_rows) >= top_k:
+        rows = lex_rows
+        fused = (1 - lexical_weight) * index.score_rows(query_vec, rows) + lexical_weight * lex_norm
+    else:
+        rows = np.arange(len(index))
+        fused = (1 - lexical_weight) * index.score_rows(query_vec, rows)
+        fused[lex_rows] += lexical_weight * lex_norm
+
+    k = min(top_k, len(rows))
+    best = np.argpartition(fused, -k)[-k:]
+    best = best[np.argsort(fused[best])[::-1]]
+    return [(index.chunks[rows[i]], float(fused[i])) for i in best]
+
+
+def find_relevant_chunks(query: str, papers: List[dict], project: str, top_k: int = 3,
+                         batch_size: int = ENCODE_BATCH_SIZE, lexical_weight: float = LEXICAL_WEIGHT,
+                         candidate_pool: int = CANDIDATE_POOL):
+    model = get_model()
+    index = load_synced_index(project, papers, model.encode, batch_size)
+    if len(index) == 0:
+        return []
+
+    with tracing.span("encode_query"):
+        query_vec = model.encode(query)
+    with tracing.span("score", rows=len(index)):
+        bm25 = load_bm25(index, get_index_path(project)) if lexical_weight > 0 else None
+        ranked = hybrid_search(index, bm25, query, query_vec, top_k, lexical_weight, candidate_pool)
+    papers_by_id = {p["id"]: p for p in papers}
+    return [
+        {
+            "score": score,
+            "chunk": chunk["chunk"],
+            "paper": papers_by_id[chunk["paper_id"]],
+            "page": chunk["page"],
+            "start": chunk["start"],
+            "end": chunk["end"]
+        }
+        for chunk, score in ranked
+    ]
+
+
+def find_relevant_chunks_all_projects(query: str, top_k: int = 3, nprobe: int = NPROBE,
+                                      current_project: str = None, current_papers: List[dict] = None):
+    # Same result shape as find_relevant_chunks plus "project". Projects are
+    # searched through their existing chunk indexes; the current one is
+    # synced first so its latest papers are included.
+    model = get_model()
+    if current_project:
+        load_synced_index(current_project, current_papers or [], model.encode)
+
+    with tracing.span("encode_query"):
+        query_vec = model.encode(query)
+
+    # A row is only valid against the version of its paper it was synced
+    # from; if a paper changed since, search again once so the ANN index
+    # picks the change up, then drop whatever is still out of date.
+    for attempt in range(2):
+        hits = search_synced(query_vec, top_k, nprobe)
+        indexes = {}
+        stale = set()
+        for i, (project, paper_id, paper_row, _, signature) in enumerate(hits):
+            if project not in indexes:
+                indexes[project] = get_chunk_index(project)
+            entry = indexes[project].papers.get(paper_id)
+            if entry is None or entry["signature"] != signature or paper_row >= entry["rows"]:
+                stale.add(i)
+        if not stale:
+            break
+        tracing.count("ann_stale_rows", len(stale))
+
+    papers = {}
+    results = []
+    for i, (project, paper_id, paper_row, score, _) in enumerate(hits):
+        if i in stale:
+            continue
+        index = indexes[project]
+        if project not in papers:
+            papers[project] = {p["id"]: p for p in load_saved_papers(project)}
+        chunk = index.chunks[index.paper_starts()[paper_id] + paper_row]
+        paper = papers[project].get(paper_id)
+        if paper is None:
+            continue
+        results.append({
+            "score": score,
+            "chunk": chunk["chunk"],
+            "paper": paper,
+            "page": chunk["page"],
+            "start": chunk["start"],
+            "end": chunk["end"],
+            "project": project
+        })
+    return results
+
+
+def build_extract_prompt(query: str, chunk: str, paper: dict, page: int):
+    return f"""
 You are an academic research assistant. Given a question and a passage from a paper,
 extract the exact sentence(s) from the passage that best answer the question.
 If no answer is found in the passage, reply: "Not found."
@@ -48,20 +182,93 @@ Passage:
 
 Answer:
 """
-    response = run_llama_prompt(prompt)
+
+
+def llama_extract_answer(query: str, chunk: str, paper: dict, page: int):
+    response = run_llama_prompt(build_extract_prompt(query, chunk, paper, page))
     return response.strip()
 
 
-def search_with_semantic_filter(query: str, papers: List[dict], project: str, top_k: int = 3):
-    chunks = find_relevant_chunks(query, papers, project, top_k)
-    results = []
-    for c in chunks:
-        answer = llama_extract_answer(query, c["chunk"], c["paper"], c["page"])
-        results.append({
-            "answer": answer,
-            "chunk": c["chunk"],
-            "paper": c["paper"],
-            "page": c["page"],
-            "score": c["score"]
-        })
-    return results
\ No newline at end of file
+def safe_extract_answer(query: str, chunk: dict):
+    # One failing chunk should not sink the whole search
+    try:
+        return llama_extract_answer(query, chunk["chunk"], chunk["paper"], chunk["page"])
+    except Exception as e:
+        return f"Error: {e}"
+
+
+def stream_extract_answer(query: str, chunk: dict):
+    # Same prompt and cache entry as llama_extract_answer, yielded as it is generated
+    try:
+        yield from stream_llama_prompt(build_extract_prompt(query, chunk["chunk"], chunk["paper"], chunk["page"]))
+    except Exception as e:
+        yield f"Error: {e}"
+
+
+def iter_answer_progress(query: str, chunks: List[dict], max_workers: int = LLM_CONCURRENCY,
+                         interval: float = 0.1):
+    # Streams every answer in parallel and yields (answers so far, done flags)
+    # every `interval` seconds; the last yield holds the complete answers.
+    answers = [""] * len(chunks)
+    done = [False] * len(chunks)
+
+    def run(i):
+        try:
+            for piece in stream_extract_answer(query, chunks[i]):
+                answers[i] += piece
+        finally:
+            answers[i] = answers[i].strip()
+            done[i] = True
+
+    workers = max(1, min(max_workers, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(tracing.bind(run), i) for i in range(len(chunks))]
+        while not all(f.done() for f in futures):
+            time.sleep(interval)
+            yield list(answers), list(done)
+    yield list(answers), list(done)
+
+
+def retrieve_chunks(query: str, papers: List[dict], project: str, top_k: int = 3,
+                    lexical_weight: float = LEXICAL_WEIGHT, all_projects: bool = False,
+                    rerank: bool = False, rerank_threshold: Optional[float] = RERANK_THRESHOLD):
+    # With rerank, a wider pool is retrieved and the cross-encoder keeps the
+    # top_k passages that look likely to answer the question.
+    pool = candidate_count(top_k) if rerank else top_k
+    if all_projects:
+        chunks = find_relevant_chunks_all_projects(query, pool, current_project=project, current_papers=papers)
+    else:
+        chunks = find_relevant_chunks(query, papers, project, pool, lexical_weight=lexical_weight)
+    if rerank:
+        chunks = rerank_chunks(query, chunks, top_k, rerank_threshold)
+    return chunks
+
+
+def make_result(c: dict, answer: str, project: str):
+    return {
+        "answer": answer,
+        "chunk": c["chunk"],
+        "paper": c["paper"],
+        "page": c["page"],
+        "start": c["start"],
+        "end": c["end"],
+        "score": c["score"],
+        "rerank_score": c.get("rerank_score"),
+        "project": c.get("project", project)
+    }
+
+
+def search_with_semantic_filter(query: str, papers: List[dict], project: str, top_k: int = 3,
+                                max_workers: int = LLM_CONCURRENCY, lexical_weight: float = LEXICAL_WEIGHT,
+                                all_projects: bool = False, rerank: bool = False,
+                                rerank_threshold: Optional[float] = RERANK_THRESHOLD):
+    chunks = retrieve_chunks(query, papers, project, top_k, lexical_weight, all_projects, rerank, rerank_threshold)
+    if not chunks:
+        return []
+
+    # executor.map keeps the ranking order regardless of which call finishes first
+    workers = max(1, min(max_workers, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        answers = list(executor.map(tracing.bind(lambda c: safe_extract_answer(query, c)), chunks))
+
+    return [make_result(c, answer, project) for c, answer in zip(chunks, answers)]
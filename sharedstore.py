@@ -0,0 +1,155 @@
+import os
+import json
+import threading
+import numpy as np
+from filelock import FileLock
+from textstore import get_text_store, paper_key
+
+SHARED_DIR = os.path.join("projects", ".shared")
+PDF_DIR = "pdfs"
+TEXT_DIR = "text"
+EMBED_DIR = "embeddings"
+REFS_FILE = "refs.json"
+LOCK_FILE = "refs.lock"
+
+
+#==================== Store ====================#
+
+class SharedStore:
+    # PDFs, page text and chunk embeddings shared by every project, keyed by
+    # content key (normalized arXiv id or a hash of the paper link). refs.json
+    # records which projects use each key; files are removed once the last
+    # project releases them.
+    def __init__(self, folder=SHARED_DIR):
+        self.folder = folder
+        for sub in (PDF_DIR, EMBED_DIR):
+            os.makedirs(os.path.join(folder, sub), exist_ok=True)
+        self.text = get_text_store(os.path.join(folder, TEXT_DIR))
+        self.refs_path = os.path.join(folder, REFS_FILE)
+        self.file_lock = FileLock(os.path.join(folder, LOCK_FILE))
+        self.lock = threading.RLock()
+        self.refs = {}          # key -> sorted project names
+        self._refs_mtime = None
+
+    #---------- paths ----------#
+
+    def pdf_path(self, key):
+        return os.path.join(self.folder, PDF_DIR, f"{paper_key(key)}.pdf")
+
+    def embeddings_path(self, key):
+        return os.path.join(self.folder, EMBED_DIR, f"{paper_key(key)}.npz")
+
+    #---------- references ----------#
+
+    def _reload(self):
+        if not os.path.exists(self.refs_path):
+            return
+        stat = os.stat(self.refs_path)
+        mtime = (stat.st_mtime_ns, stat.st_size)
+        if mtime == self._refs_mtime:
+            return
+        with open(self.refs_path, "r") as f:
+            self.refs = json.load(f)
+        self._refs_mtime = mtime
+
+    def _write(self):
+        tmp = self.refs_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.refs, f)
+        os.replace(tmp, self.refs_path)
+        stat = os.stat(self.refs_path)
+        self._refs_mtime = (stat.st_mtime_ns, stat.st_size)
+
+    def projects_for(self, key):
+        with self.lock:
+            self._reload()
+            return list(self.refs.get(key, []))
+
+    def acquire(self, project, keys):
+        with self.lock:
+            # Cheap check first; the common case is that nothing is new
+            self._reload()
+            if all(project in self.refs.get(k, []) for k in keys):
+                return
+            with self.file_lock:
+                self._reload()
+                for key in keys:
+                    users = self.refs.setdefault(key, [])
+                    if project not in users:
+                        users.append(project)
+                        users.sort()
+                self._write()
+
+    def release(self, project, keys):
+        # Returns the keys whose files were garbage collected
+        with self.lock, self.file_lock:
+            self._reload()
+            freed = []
+            for key in keys:
+                users = [p for p in self.refs.get(key, []) if p != project]
+                if users:
+                    self.refs[key] = users
+                    continue
+                self.refs.pop(key, None)
+                freed.append(key)
+            self._write()
+            for key in freed:
+                self._remove_files(key)
+            return freed
+
+    def release_project(self, project):
+        with self.lock:
+            self._reload()
+            keys = [k for k, users in self.refs.items() if project in users]
+        return self.release(project, keys)
+
+    def rename_project(self, old, new):
+        with self.lock, self.file_lock:
+            self._reload()
+            for key, users in self.refs.items():
+                if old in users:
+                    self.refs[key] = sorted({new if p == old else p for p in users})
+            self._write()
+
+    def _remove_files(self, key):
+        for path in (self.pdf_path(key), self.pdf_path(key) + ".part", self.embeddings_path(key)):
+            if os.path.exists(path):
+                os.remove(path)
+        self.text.delete(key)
+
+    #---------- embeddings ----------#
+
+    def load_embeddings(self, key, signature):
+        # Returns (chunks, vectors) computed from this exact page text with
+        # the same chunker and model (see indexer.embedding_signature), or None
+        path = self.embeddings_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            data = np.load(path, allow_pickle=False)
+            if data["signature"].item() != signature:
+                return None
+            return json.loads(data["chunks"].item()), data["vectors"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Discarding unreadable embeddings for {key}:", e)
+            return None
+
+    def save_embeddings(self, key, signature, chunks, vectors):
+        path = self.embeddings_path(key)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, signature=np.array(signature), chunks=np.array(json.dumps(chunks)), vectors=vectors)
+        os.replace(tmp, path)
+
+
+#==================== Shared Instance ====================#
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def get_shared_store():
+    global _shared
+    with _shared_lock:
+        if _shared is None or not os.path.isdir(_shared.folder):
+            _shared = SharedStore()
+        return _shared
@@ -0,0 +1,228 @@
+import os
+import json
+import sqlite3
+import threading
+
+DB_FILE = "project.db"
+# "sqlite" makes every project use the database, importing JSON data on first use
+STORAGE_ENGINE = os.environ.get("SUMMARAIZE_STORAGE", "json")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    paper_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS notes (
+    paper_id TEXT PRIMARY KEY,
+    note TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS config (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    data TEXT NOT NULL
+);
+"""
+
+
+#==================== Connections ====================#
+
+_open = {}      # db path -> (connection, lock) shared by every thread
+_open_lock = threading.Lock()
+
+def get_db_path(project_path):
+    return os.path.join(project_path, DB_FILE)
+
+def uses_sqlite(project_path):
+    return STORAGE_ENGINE == "sqlite" or os.path.exists(get_db_path(project_path))
+
+def _open_db(project_path):
+    path = os.path.abspath(get_db_path(project_path))
+    with _open_lock:
+        db = _open.get(path)
+        if db is None:
+            created = not os.path.exists(path)
+            os.makedirs(project_path, exist_ok=True)
+            conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            if created:
+                _import_json(project_path, conn)
+            db = _open[path] = (conn, threading.Lock())
+        return path, db
+
+class connect:
+    # One connection per database, shared by every thread (Streamlit runs
+    # each rerun on a new one) and used by one of them at a time. WAL lets
+    # readers in other processes keep going while this one writes.
+    def __init__(self, project_path):
+        self.project_path = project_path
+
+    def __enter__(self):
+        while True:
+            path, (conn, lock) = _open_db(self.project_path)
+            lock.acquire()
+            with _open_lock:
+                # close_project_db may have closed it while we waited
+                if _open.get(path) == (conn, lock):
+                    self.lock = lock
+                    return conn
+            lock.release()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.lock.release()
+
+def close_project_db(project_path):
+    # Call before a project folder is renamed or deleted
+    path = os.path.abspath(get_db_path(project_path))
+    with _open_lock:
+        db = _open.pop(path, None)
+    if db is not None:
+        conn, lock = db
+        with lock:
+            conn.close()
+
+class transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+#==================== Papers ====================#
+
+def load_papers(project_path):
+    with connect(project_path) as conn:
+        rows = conn.execute("SELECT data FROM papers ORDER BY position").fetchall()
+    return [json.loads(r[0]) for r in rows]
+
+def upsert_papers(project_path, papers):
+    with connect(project_path) as conn, transaction(conn):
+        for paper in papers:
+            row = conn.execute("SELECT position FROM papers WHERE id = ?", (paper["id"],)).fetchone()
+            if row is None:
+                row = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM papers").fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO papers (id, position, data) VALUES (?, ?, ?)",
+                (paper["id"], row[0], json.dumps(paper))
+            )
+
+def delete_paper(project_path, paper_id):
+    with connect(project_path) as conn, transaction(conn):
+        conn.execute("DELETE FROM papers WHERE id = ?", (paper_id,))
+
+def replace_papers(project_path, papers):
+    # Full-list save: only rows that actually changed are written
+    with connect(project_path) as conn, transaction(conn):
+        existing = dict(conn.execute("SELECT id, data FROM papers").fetchall())
+        wanted = set()
+        for position, paper in enumerate(papers):
+            wanted.add(paper["id"])
+            data = json.dumps(paper)
+            if existing.get(paper["id"]) != data:
+                conn.execute(
+                    "INSERT OR REPLACE INTO papers (id, position, data) VALUES (?, ?, ?)",
+                    (paper["id"], position, data)
+                )
+            else:
+                conn.execute("UPDATE papers SET position = ? WHERE id = ?", (position, paper["id"]))
+        stale = [(pid,) for pid in existing if pid not in wanted]
+        conn.executemany("DELETE FROM papers WHERE id = ?", stale)
+
+
+#==================== Summaries ====================#
+
+def load_summaries(project_path):
+    with connect(project_path) as conn:
+        rows = conn.execute("SELECT paper_id, data FROM summaries").fetchall()
+    return {pid: json.loads(data) for pid, data in rows}
+
+def upsert_summaries(project_path, summaries):
+    with connect(project_path) as conn, transaction(conn):
+        conn.executemany(
+            "INSERT OR REPLACE INTO summaries (paper_id, data) VALUES (?, ?)",
+            [(pid, json.dumps(data)) for pid, data in summaries.items()]
+        )
+
+
+#==================== Notes ====================#
+
+def load_notes(project_path):
+    with connect(project_path) as conn:
+        return dict(conn.execute("SELECT paper_id, note FROM notes").fetchall())
+
+def upsert_note(project_path, paper_id, note):
+    with connect(project_path) as conn, transaction(conn):
+        conn.execute("INSERT OR REPLACE INTO notes (paper_id, note) VALUES (?, ?)", (paper_id, note))
+
+
+#==================== Config ====================#
+
+def load_config(project_path):
+    with connect(project_path) as conn:
+        row = conn.execute("SELECT data FROM config WHERE id = 1").fetchone()
+    return json.loads(row[0]) if row else None
+
+def save_config(project_path, config):
+    with connect(project_path) as conn, transaction(conn):
+        conn.execute("INSERT OR REPLACE INTO config (id, data) VALUES (1, ?)", (json.dumps(config),))
+
+
+#==================== Import ====================#
+
+def _read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r") as f:
+        return json.load(f)
+
+def import_json_project(project_path):
+    # One-shot copy of the JSON layout into the database. The JSON files are
+    # left in place, but the database takes precedence from now on.
+    with connect(project_path) as conn:
+        return _import_json(project_path, conn)
+
+def _import_json(project_path, conn):
+    papers = _read_json(os.path.join(project_path, "saved_papers.json"), [])
+    summaries = _read_json(os.path.join(project_path, "summary_cache.json"), {})
+    notes = _read_json(os.path.join(project_path, "notes.json"), {})
+    config = _read_json(os.path.join(project_path, "project_config.json"), None)
+
+    with transaction(conn):
+        conn.executemany(
+            "INSERT OR IGNORE INTO papers (id, position, data) VALUES (?, ?, ?)",
+            [(p["id"], i, json.dumps(p)) for i, p in enumerate(papers)]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO summaries (paper_id, data) VALUES (?, ?)",
+            [(pid, json.dumps(data)) for pid, data in summaries.items()]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO notes (paper_id, note) VALUES (?, ?)",
+            list(notes.items())
+        )
+        if config is not None:
+            conn.execute("INSERT OR IGNORE INTO config (id, data) VALUES (1, ?)", (json.dumps(config),))
+    return {"papers": len(papers), "summaries": len(summaries), "notes": len(notes)}
+
+
+if __name__ == "__main__":
+    # python sqlite_backend.py <project> [<project> ...]
+    import sys
+
+    for name in sys.argv[1:]:
+        project_path = os.path.join("projects", name)
+        if os.path.exists(get_db_path(project_path)):
+            print(f"{name}: already uses SQLite")
+            continue
+        counts = import_json_project(project_path)
+        print(f"{name}: imported {counts['papers']} papers, {counts['summaries']} summaries, {counts['notes']} notes")
@@ -1,14 +1,24 @@
 import requests
 import feedparser
-from utils import run_llama_prompt
-from duckduckgo_search import DDGS
+from utils import run_llama_prompt, load_saved_papers, normalize_arxiv_id, ARXIV_API_URL
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 import hashlib
 import re
+import tracing
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/111.0.0.0 Safari/537.36"
 }
 
+FETCH_CONCURRENCY = 5
+
+# Shared keep-alive session for all arXiv requests
+session = requests.Session()
+session.headers.update(HEADERS)
+session.mount("http://", HTTPAdapter(pool_maxsize=FETCH_CONCURRENCY))
+session.mount("https://", HTTPAdapter(pool_maxsize=FETCH_CONCURRENCY))
+
 
 def generate_search_queries_from_project(config):
     title = config.get("title", "")
@@ -33,7 +43,6 @@ def generate_search_queries_from_project(config):
 
 
 def fetch_arxiv_papers(query, max_results=5):
-    base_url = "http://export.arxiv.org/api/query"
     params = {
         "search_query": f"all:{query}",
         "start": 0,
@@ -42,7 +51,12 @@ def fetch_arxiv_papers(query, max_results=5):
         "sortOrder": "descending"
     }
 
-    response = requests.get(base_url, params=params)
+    try:
+        with tracing.span("arxiv_search", query=query):
+            response = session.get(ARXIV_API_URL, params=params, timeout=15)
+    except requests.RequestException as e:
+        print("arXiv fetch failed:", e)
+        return []
     if response.status_code != 200:
         return []
 
@@ -62,6 +76,8 @@ def fetch_arxiv_papers(query, max_results=5):
     return results
 
 def fetch_web_papers(query, max_results=5):
+    from duckduckgo_search import DDGS
+
     results = []
     with DDGS() as ddgs:
         for r in ddgs.text(f"{query} filetype:pdf", max_results=max_results * 2):
@@ -102,36 +118,123 @@ def is_semantically_relevant(config, paper):
     return "yes" in result
 
 
+RELEVANCE_BATCH_SIZE = 10
+MAX_ABSTRACT_CHARS = 1200
+
+def parse_relevance_answers(output, count):
+    # Accepts "1: YES", "[2] no", "3) Yes - ..." and similar; unparsable or
+    # out-of-range lines are ignored so those candidates fall back.
+    answers = {}
+    for line in output.splitlines():
+        match = re.match(r"^\W*(\d+)\W+(yes|no)\b", line.strip(), re.IGNORECASE)
+        if match:
+            idx = int(match.group(1))
+            if 1 <= idx <= count and idx not in answers:
+                answers[idx] = match.group(2).lower() == "yes"
+    return answers
+
+def classify_relevance_batch(config, papers):
+    title = config.get("title", "")
+    desc = config.get("description", "")
+    keywords = ", ".join(config.get("keywords", []))
+    additional = config.get("custom_query", "")
+
+    candidates = "\n\n".join(
+        f"[{i}] Title: {paper['title']}\nAbstract: {paper['summary'][:MAX_ABSTRACT_CHARS]}"
+        for i, paper in enumerate(papers, start=1)
+    )
+
+    prompt = f"""
+    Project Title: {title}
+    Project Description: {desc}
+    Project Keywords: {keywords}
+    Additional Query: {additional}
+
+    Candidate Papers:
+    {candidates}
+
+    For each candidate paper, decide whether it is directly relevant to given project information and considering additional query requested by the user.
+    Answer with exactly one line per candidate, in order, formatted as "<number>: YES" or "<number>: NO". Do not output anything else.
+    """
+    output = run_llama_prompt(prompt)
+    if output.startswith("Error:"):
+        # The server is failing; asking again per paper would only fail slower
+        return [False] * len(papers)
+    answers = parse_relevance_answers(output, len(papers))
+
+    # Ask individually for anything the batch answer did not cover
+    return [
+        answers[i] if i in answers else is_semantically_relevant(config, paper)
+        for i, paper in enumerate(papers, start=1)
+    ]
+
+def filter_relevant_papers(config, papers, batch_size=RELEVANCE_BATCH_SIZE):
+    relevant = []
+    for start in range(0, len(papers), batch_size):
+        batch = papers[start:start + batch_size]
+        with tracing.span("relevance_batch", papers=len(batch)):
+            verdicts = classify_relevance_batch(config, batch)
+        relevant.extend(p for p, ok in zip(batch, verdicts) if ok)
+    return relevant
+
+
 def clean_text(text):
     return re.sub(r"\s+", " ", text.strip())
 
-def generate_live_suggestions(config):
+def normalize_title(title):
+    return re.sub(r"[^a-z0-9]+", " ", title.lower()).strip()
+
+def paper_keys(paper):
+    keys = set()
+    title = normalize_title(paper.get("title", ""))
+    if title:
+        keys.add(("title", title))
+    if paper.get("id"):
+        keys.add(("id", normalize_arxiv_id(paper["id"])))
+    return keys
+
+def fetch_all_candidates(queries, max_workers=FETCH_CONCURRENCY):
+    if not queries:
+        return []
+    # Each query is an independent request on the shared session
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(queries))) as executor:
+        batches = list(executor.map(tracing.bind(fetch_arxiv_papers), queries))
+    web = [] #fetch_web_papers(query) # Disabled for now
+    return [paper for batch in batches for paper in batch] + web
+
+def generate_live_suggestions(config, project_name=None):
     queries = generate_search_queries_from_project(config)
-    print("Queries:", queries)
-
-    suggested = []
-    seen_ids = set()
-
-    for query in queries:
-        arxiv = fetch_arxiv_papers(query)
-        web = [] #fetch_web_papers(query) # Disabled for now
-        papers = arxiv + web
-        print(len(papers))
-        for paper in papers:
-            # Clean up
-            paper["title"] = clean_text(paper.get("title", "Untitled"))
-            paper["summary"] = clean_text(paper.get("summary", ""))
-            paper["authors"] = clean_text(paper.get("authors", "?"))
-            print(paper["title"])
-            # Generate fallback ID from URL or title hash
-            pid = paper.get("id") or paper.get("link") or hashlib.md5(paper["title"].encode()).hexdigest()
-            paper["id"] = pid
-
-            if pid in seen_ids:
-                continue
-
-            if is_semantically_relevant(config, paper):
-                suggested.append(paper)
-                seen_ids.add(pid)
-
-    return suggested
+    tracing.count("suggestion_queries", len(queries))
+
+    papers = fetch_all_candidates(queries)
+    tracing.count("suggestion_candidates", len(papers), stage="fetched")
+
+    # Papers already saved in the project are never suggested again
+    seen_keys = set()
+    if project_name:
+        for saved in load_saved_papers(project_name):
+            seen_keys |= paper_keys(saved)
+
+    # Deduplicate everything before any LLM work
+    candidates = []
+    for paper in papers:
+        # Clean up
+        paper["title"] = clean_text(paper.get("title", "Untitled"))
+        paper["summary"] = clean_text(paper.get("summary", ""))
+        paper["authors"] = clean_text(paper.get("authors", "?"))
+        # Generate fallback ID from URL or title hash
+        pid = paper.get("id") or paper.get("link") or hashlib.md5(paper["title"].encode()).hexdigest()
+        paper["id"] = pid
+
+        keys = paper_keys(paper)
+        if keys & seen_keys:
+            continue
+        seen_keys |= keys
+        candidates.append(paper)
+
+    tracing.count("suggestion_candidates", len(candidates), stage="deduplicated")
+
+    # One LLM call judges a whole batch of candidates
+    relevant = filter_relevant_papers(config, candidates)
+    tracing.count("suggestion_candidates", len(relevant), stage="relevant")
+    return relevant
@@ -1,32 +1,48 @@
 import os
 import json
+import time
+import queue
+import threading
 from utils import *
+from project_store import project_store
+import sqlite_backend
 
 SUMMARY_FILE = "summary_cache.json"
 
 #==================== Summaries ====================#
 def load_summary_cache(project_name):
+    if sqlite_backend.uses_sqlite(get_project_path(project_name)):
+        return sqlite_backend.load_summaries(get_project_path(project_name))
     path = os.path.join(get_project_path(project_name), SUMMARY_FILE)
-    if os.path.exists(path):
-        with open(path, "r") as f:
-            return json.load(f)
-    return {}
+    return project_store.load_json(path, dict)
 
 def save_summary_cache(cache, project_name):
     os.makedirs(get_project_path(project_name), exist_ok=True)
+    if sqlite_backend.uses_sqlite(get_project_path(project_name)):
+        current = sqlite_backend.load_summaries(get_project_path(project_name))
+        changed = {pid: data for pid, data in cache.items() if current.get(pid) != data}
+        sqlite_backend.upsert_summaries(get_project_path(project_name), changed)
+        return
     path = os.path.join(get_project_path(project_name), "summary_cache.json")
-    with open(path, "w") as f:
-        json.dump(cache, f, indent=2)
+    project_store.save_json(path, cache)
 
+def update_summaries(summaries, project_name):
+    # Row-level write of new summaries, merged into the JSON file otherwise
+    if sqlite_backend.uses_sqlite(get_project_path(project_name)):
+        sqlite_backend.upsert_summaries(get_project_path(project_name), summaries)
+        return
+    cache = dict(load_summary_cache(project_name))
+    cache.update(summaries)
+    save_summary_cache(cache, project_name)
 
-def summarize_paper(paper_id, abstract, cache, project_name):
-    if paper_id in cache:
-        return cache[paper_id]
 
-    prompt = f"Summarize this research abstract in 1-2 concise sentences and give 3-5 key terms:\n\n{abstract}\n\nReturn only the summary followed by keywords in this format:\nSummary: ...\nKeywords: ..."
+SUMMARY_CONCURRENCY = 2
+FLUSH_EVERY = 5
+RETRY_FAILED_AFTER = 60     # seconds before a failed summary is tried again on its own
 
-    result = run_llama_prompt(prompt)
-    lines = result.strip().split("\n")
+
+def parse_summary(text):
+    lines = text.strip().split("\n")
 
     summary_line = next((l for l in lines if l.lower().startswith("summary:")), "Summary: ...")
     keywords_line = next((l for l in lines if l.lower().startswith("keywords:")), "Keywords: ...")
@@ -34,6 +50,167 @@ def summarize_paper(paper_id, abstract, cache, project_name):
     summary = summary_line.replace("Summary:", "").strip()
     keywords = keywords_line.replace("Keywords:", "").strip()
 
-    cache[paper_id] = {"summary": summary, "keywords": keywords}
-    save_summary_cache(cache, project_name)
-    return cache[paper_id]
\ No newline at end of file
+    return {"summary": summary, "keywords": keywords}
+
+
+def generate_summary(abstract, on_text=None):
+    # on_text, if given, is called with the text so far as tokens stream in
+    prompt = f"Summarize this research abstract in 1-2 concise sentences and give 3-5 key terms:\n\n{abstract}\n\nReturn only the summary followed by keywords in this format:\nSummary: ...\nKeywords: ..."
+
+    if on_text is None:
+        result = run_llama_prompt(prompt)
+    else:
+        result = ""
+        for piece in stream_llama_prompt(prompt):
+            result += piece
+            on_text(result)
+    if result.startswith("Error:") or "\nError:" in result:
+        raise RuntimeError(result)
+    return parse_summary(result)
+
+
+def summarize_paper(paper_id, abstract, cache, project_name):
+    if paper_id in cache:
+        return cache[paper_id]
+
+    cache[paper_id] = generate_summary(abstract)
+    update_summaries({paper_id: cache[paper_id]}, project_name)
+    return cache[paper_id]
+
+
+#==================== Background Worker ====================#
+
+class SummaryWorker:
+    # Summarizes queued papers on a few daemon threads and writes finished
+    # summaries to disk in batches, so the UI only has to poll.
+    def __init__(self, max_workers=SUMMARY_CONCURRENCY, flush_every=FLUSH_EVERY):
+        self.flush_every = flush_every
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()     # one disk write at a time, taken without self.lock
+        self.pending = {}    # project -> paper ids queued or running
+        self.unsaved = {}    # project -> {paper_id: summary} not yet on disk
+        self.saving = {}     # project -> {paper_id: summary} being written
+        self.failed = {}     # project -> {paper_id: (error, time)} for failed jobs
+        self.version = {}    # project -> bumps on every flush or failure
+        self.partial = {}    # (project, paper_id) -> text streamed so far
+
+        for _ in range(max_workers):
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, project, paper_id, abstract, retry=False):
+        # Skips papers queued, finished but not on disk yet, or failed less
+        # than RETRY_FAILED_AFTER ago (unless retry=True, e.g. from a button)
+        with self.lock:
+            if (paper_id in self.pending.get(project, set()) or paper_id in self.unsaved.get(project, {})
+                    or paper_id in self.saving.get(project, {})):
+                return False
+            failure = self.failed.get(project, {}).get(paper_id)
+            if failure and not retry and time.time() - failure[1] < RETRY_FAILED_AFTER:
+                return False
+            self.failed.get(project, {}).pop(paper_id, None)
+            self.pending.setdefault(project, set()).add(paper_id)
+        self.jobs.put((project, paper_id, abstract))
+        return True
+
+    def _run(self):
+        while True:
+            project, paper_id, abstract = self.jobs.get()
+            def on_text(text):
+                with self.lock:
+                    self.partial[(project, paper_id)] = text
+
+            error = None
+            try:
+                summary = generate_summary(abstract, on_text=on_text)
+            except Exception as e:
+                print(f"Summary failed for {paper_id}:", e)
+                summary = None
+                error = str(e).removeprefix("Error: ")
+
+            with self.lock:
+                self.partial.pop((project, paper_id), None)
+                self.pending.get(project, set()).discard(paper_id)
+                if summary is None:
+                    self.failed.setdefault(project, {})[paper_id] = (error, time.time())
+                    # Lets the page rerun and show the failure instead of waiting
+                    self.version[project] = self.version.get(project, 0) + 1
+                else:
+                    self.unsaved.setdefault(project, {})[paper_id] = summary
+                batch = None
+                if len(self.unsaved.get(project, {})) >= self.flush_every or not self.pending.get(project):
+                    batch = self.unsaved.pop(project, {})
+                    self.saving.setdefault(project, {}).update(batch)
+            if batch:
+                self._flush(project, batch)
+            self.jobs.task_done()
+
+    def _flush(self, project, batch):
+        # Runs without self.lock: the write can wait seconds on a busy
+        # database while the UI keeps polling progress
+        try:
+            with self.write_lock:
+                # Skip projects that were deleted or renamed while summarizing
+                if os.path.isdir(get_project_path(project)):
+                    update_summaries(batch, project)
+        except Exception as e:
+            print(f"Saving summaries failed for {project}:", e)
+        with self.lock:
+            saving = self.saving.get(project, {})
+            for paper_id in batch:
+                saving.pop(paper_id, None)
+            if not saving:
+                self.saving.pop(project, None)
+            self.version[project] = self.version.get(project, 0) + 1
+
+    def get_progress(self, project, paper_id):
+        # Summary as far as it is known before it reaches the disk: finished
+        # but not written yet, or parsed from the tokens streamed so far.
+        with self.lock:
+            done = self.unsaved.get(project, {}).get(paper_id) or self.saving.get(project, {}).get(paper_id)
+            text = self.partial.get((project, paper_id))
+        if done is not None:
+            return done
+        if text:
+            return parse_summary(text)
+        return None
+
+    def get_failure(self, project, paper_id):
+        # The error message if the last attempt failed, else None
+        with self.lock:
+            failure = self.failed.get(project, {}).get(paper_id)
+        return failure[0] if failure else None
+
+    def failed_count(self, project):
+        with self.lock:
+            return len(self.failed.get(project, {}))
+
+    def is_pending(self, project, paper_id):
+        with self.lock:
+            return paper_id in self.pending.get(project, set())
+
+    def pending_count(self, project):
+        with self.lock:
+            return len(self.pending.get(project, set()))
+
+    def get_version(self, project):
+        with self.lock:
+            return self.version.get(project, 0)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def get_summary_worker():
+    # One worker per process, shared by every Streamlit session and rerun
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = SummaryWorker()
+        return _worker
+
+def queue_missing_summaries(papers, cache, project_name):
+    worker = get_summary_worker()
+    for paper in papers:
+        if paper["id"] not in cache:
+            worker.submit(project_name, paper["id"], paper["summary"])
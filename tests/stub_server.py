@@ -0,0 +1,63 @@
+# Minimal scriptable HTTP server for the client tests. Each route is a
+# function of the request that returns (status, headers, body); requests
+# are recorded so tests can check what the client sent.
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubServer:
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self._handle(b"")
+
+            def do_POST(self):
+                self._handle(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+
+            def _handle(self, body):
+                request = {"method": self.command, "path": self.path, "headers": dict(self.headers), "body": body}
+                server.requests.append(request)
+                route = server.routes.get(self.path)
+                if route is None:
+                    status, headers, payload = 404, {}, b"not found"
+                else:
+                    status, headers, payload = route(request)
+                if isinstance(payload, (dict, list)):
+                    payload = json.dumps(payload).encode("utf-8")
+                    headers = {"Content-Type": "application/json", **headers}
+                declared = headers.pop("X-Declared-Length", len(payload))
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(declared))
+                self.end_headers()
+                self.wfile.write(payload)
+                if declared != len(payload):
+                    # Simulate a connection dropped mid-body
+                    self.close_connection = True
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count(self, path):
+        return sum(r["path"] == path for r in self.requests)
@@ -0,0 +1,18 @@
+from chunker import chunk_pages, count_tokens, MAX_TOKENS
+
+
+def test_long_numeric_sentence_stays_within_budget():
+    # Each "12.34," is four tokens, so word counts alone would overshoot
+    text = " ".join("%d.%02d," % (i, i % 100) for i in range(1500))
+    chunks = chunk_pages({"1": text})
+
+    assert max(count_tokens(c["chunk"]) for c in chunks) <= MAX_TOKENS
+    assert all(c["start"] == 0 or text[c["start"] - 1] == " " for c in chunks)
+    assert sum(count_tokens(c["chunk"]) for c in chunks) == count_tokens(text)
+
+def test_single_overlong_word_is_cut_between_tokens():
+    text = "Intro sentence here. " + ".".join(["a"] * 900)
+    chunks = chunk_pages({"1": text})
+
+    assert max(count_tokens(c["chunk"]) for c in chunks) <= MAX_TOKENS
+    assert chunks[-1]["end"] == len(text)
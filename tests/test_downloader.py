@@ -0,0 +1,124 @@
+import re
+import pytest
+import requests
+
+from downloader import download_file, DownloadError
+
+PDF = b"%PDF-1.4\n" + bytes(range(256)) * 40
+
+
+def ranged(content, content_type="application/pdf"):
+    # Serves `content` and honors "Range: bytes=N-" like arXiv does
+    def route(request):
+        match = re.match(r"bytes=(\d+)-", request["headers"].get("Range", ""))
+        if not match:
+            return 200, {"Content-Type": content_type}, content
+        start = int(match.group(1))
+        if start >= len(content):
+            return 416, {"Content-Range": f"bytes */{len(content)}"}, b""
+        return 206, {
+            "Content-Type": content_type,
+            "Content-Range": f"bytes {start}-{len(content) - 1}/{len(content)}"
+        }, content[start:]
+    return route
+
+def paths(tmp_path):
+    dest = str(tmp_path / "paper.pdf")
+    return dest, dest + ".part"
+
+
+def test_full_download(stub, tmp_path):
+    stub.routes["/paper.pdf"] = ranged(PDF)
+    dest, part = paths(tmp_path)
+
+    assert download_file(f"{stub.url}/paper.pdf", dest) == dest
+    assert open(dest, "rb").read() == PDF
+    assert not (tmp_path / "paper.pdf.part").exists()
+    assert "Range" not in stub.requests[0]["headers"]
+
+def test_resumes_partial_file_with_range(stub, tmp_path):
+    stub.routes["/paper.pdf"] = ranged(PDF)
+    dest, part = paths(tmp_path)
+    with open(part, "wb") as f:
+        f.write(PDF[:1000])
+
+    download_file(f"{stub.url}/paper.pdf", dest)
+    assert stub.requests[0]["headers"]["Range"] == "bytes=1000-"
+    assert open(dest, "rb").read() == PDF
+
+def test_server_ignoring_range_restarts(stub, tmp_path):
+    stub.routes["/paper.pdf"] = lambda request: (200, {"Content-Type": "application/pdf"}, PDF)
+    dest, part = paths(tmp_path)
+    with open(part, "wb") as f:
+        f.write(b"stale bytes that must not be kept")
+
+    download_file(f"{stub.url}/paper.pdf", dest)
+    assert open(dest, "rb").read() == PDF
+
+def test_unsatisfiable_range_starts_over(stub, tmp_path):
+    stub.routes["/paper.pdf"] = ranged(PDF)
+    dest, part = paths(tmp_path)
+    with open(part, "wb") as f:
+        f.write(PDF + b"extra bytes from an older version")
+
+    download_file(f"{stub.url}/paper.pdf", dest)
+    assert [r["headers"].get("Range") for r in stub.requests] == [f"bytes={len(PDF) + 33}-", None]
+    assert open(dest, "rb").read() == PDF
+
+def test_short_body_keeps_part_for_resume(stub, tmp_path):
+    # Content-Range promises the whole file but only part of it arrives
+    stub.routes["/paper.pdf"] = lambda request: (206, {
+        "Content-Type": "application/pdf",
+        "Content-Range": f"bytes 0-999/{len(PDF)}"
+    }, PDF[:1000])
+    dest, part = paths(tmp_path)
+
+    with pytest.raises(DownloadError, match="Incomplete"):
+        download_file(f"{stub.url}/paper.pdf", dest)
+    assert not (tmp_path / "paper.pdf").exists()
+
+    stub.routes["/paper.pdf"] = ranged(PDF)
+    download_file(f"{stub.url}/paper.pdf", dest)
+    assert stub.requests[-1]["headers"]["Range"] == "bytes=1000-"
+    assert open(dest, "rb").read() == PDF
+
+def test_dropped_connection_keeps_part(stub, tmp_path):
+    # The body stops after a few read blocks; whole blocks stay on disk
+    big = PDF * 20
+    stub.routes["/paper.pdf"] = lambda request: (
+        200, {"Content-Type": "application/pdf", "X-Declared-Length": len(big)}, big[:len(big) * 2 // 3]
+    )
+    dest, part = paths(tmp_path)
+
+    with pytest.raises((DownloadError, requests.RequestException)):
+        download_file(f"{stub.url}/paper.pdf", dest)
+    assert not (tmp_path / "paper.pdf").exists()
+    kept = open(part, "rb").read()
+    assert kept and big.startswith(kept)
+
+    stub.routes["/paper.pdf"] = ranged(big)
+    download_file(f"{stub.url}/paper.pdf", dest)
+    assert stub.requests[-1]["headers"]["Range"] == f"bytes={len(kept)}-"
+    assert open(dest, "rb").read() == big
+
+def test_wrong_content_type_is_rejected(stub, tmp_path):
+    stub.routes["/paper.pdf"] = ranged(b"<html>captcha</html>", content_type="text/html")
+    dest, part = paths(tmp_path)
+
+    with pytest.raises(DownloadError, match="Expected application/pdf"):
+        download_file(f"{stub.url}/paper.pdf", dest)
+    assert not (tmp_path / "paper.pdf").exists()
+
+def test_bad_magic_is_rejected_and_removed(stub, tmp_path):
+    stub.routes["/paper.pdf"] = ranged(b"not a pdf at all", content_type="application/octet-stream")
+    dest, part = paths(tmp_path)
+
+    with pytest.raises(DownloadError, match="not a valid PDF"):
+        download_file(f"{stub.url}/paper.pdf", dest)
+    assert not (tmp_path / "paper.pdf").exists()
+    assert not (tmp_path / "paper.pdf.part").exists()
+
+def test_http_error_is_reported(stub, tmp_path):
+    dest, part = paths(tmp_path)
+    with pytest.raises(DownloadError, match="HTTP 404"):
+        download_file(f"{stub.url}/missing.pdf", dest)
@@ -0,0 +1,128 @@
+import json
+import pytest
+
+import ollama_client
+import llm_cache
+from ollama_client import OllamaClient, OllamaError
+
+
+def ok(text, **extra):
+    return lambda request: (200, {}, {"response": text, "done": True, **extra})
+
+def sequence(*responses):
+    # One route answering with each response in turn, then the last forever
+    responses = list(responses)
+    def route(request):
+        return responses.pop(0)(request) if len(responses) > 1 else responses[0](request)
+    return route
+
+def error(status, message):
+    return lambda request: (status, {}, {"error": message})
+
+
+#==================== Client ====================#
+
+def test_generate_sends_prompt_and_options(stub):
+    stub.routes["/api/generate"] = ok("hello")
+    client = OllamaClient(host=stub.url, retries=0)
+
+    assert client.generate("Say hi", model="llama3", options={"temperature": 0}) == "hello"
+    payload = json.loads(stub.requests[0]["body"])
+    assert payload == {"model": "llama3", "prompt": "Say hi", "stream": False, "options": {"temperature": 0}}
+
+def test_server_errors_are_retried(stub):
+    stub.routes["/api/generate"] = sequence(error(500, "busy"), ok("recovered"))
+    client = OllamaClient(host=stub.url, retries=1)
+
+    assert client.generate("x") == "recovered"
+    assert stub.count("/api/generate") == 2
+
+def test_server_error_after_last_retry_raises(stub):
+    stub.routes["/api/generate"] = error(503, "overloaded")
+    client = OllamaClient(host=stub.url, retries=1)
+
+    with pytest.raises(OllamaError) as info:
+        client.generate("x")
+    assert info.value.status == 503
+    assert "overloaded" in str(info.value)
+    assert stub.count("/api/generate") == 2
+
+def test_client_errors_are_not_retried(stub):
+    stub.routes["/api/generate"] = error(404, "model 'nope' not found")
+    client = OllamaClient(host=stub.url, retries=2)
+
+    with pytest.raises(OllamaError) as info:
+        client.generate("x", model="nope")
+    assert info.value.status == 404
+    assert "model 'nope' not found" in str(info.value)
+    assert stub.count("/api/generate") == 1
+
+def test_plain_text_error_body(stub):
+    stub.routes["/api/generate"] = lambda request: (400, {"Content-Type": "text/plain"}, b"bad request")
+    client = OllamaClient(host=stub.url, retries=0)
+
+    with pytest.raises(OllamaError, match="bad request"):
+        client.generate("x")
+
+def test_timeout_raises_ollama_error(stub):
+    import time
+    def slow(request):
+        time.sleep(1)
+        return 200, {}, {"response": "late", "done": True}
+    stub.routes["/api/generate"] = slow
+    client = OllamaClient(host=stub.url, retries=0, timeout=0.2)
+
+    with pytest.raises(OllamaError, match="request failed"):
+        client.generate("x")
+
+def test_unreachable_host_raises_ollama_error():
+    client = OllamaClient(host="http://127.0.0.1:9", retries=0)
+    with pytest.raises(OllamaError, match="request failed"):
+        client.generate("x")
+
+def test_generate_stream_yields_pieces(stub):
+    lines = [{"response": "Hel"}, {"response": "lo"}, {"response": "", "done": True, "eval_count": 2}]
+    body = "\n".join(json.dumps(line) for line in lines).encode("utf-8")
+    stub.routes["/api/generate"] = lambda request: (200, {"Content-Type": "application/x-ndjson"}, body)
+    client = OllamaClient(host=stub.url, retries=0)
+
+    assert list(client.generate_stream("x")) == ["Hel", "lo"]
+    assert json.loads(stub.requests[0]["body"])["stream"] is True
+
+def test_generate_stream_error_line_raises(stub):
+    body = b'{"response": "par"}\n{"error": "out of memory"}\n'
+    stub.routes["/api/generate"] = lambda request: (200, {"Content-Type": "application/x-ndjson"}, body)
+    client = OllamaClient(host=stub.url, retries=0)
+
+    pieces = []
+    with pytest.raises(OllamaError, match="out of memory"):
+        for piece in client.generate_stream("x"):
+            pieces.append(piece)
+    assert pieces == ["par"]
+
+
+#==================== run_llama_prompt ====================#
+
+@pytest.fixture
+def llm(stub, tmp_path, monkeypatch):
+    # The shared client and response cache, pointed at the stub and a temp file
+    monkeypatch.setattr(ollama_client, "_client", OllamaClient(host=stub.url, retries=0))
+    monkeypatch.setattr(llm_cache, "_cache", llm_cache.ResponseCache(str(tmp_path / "cache.sqlite3")))
+    return stub
+
+def test_run_llama_prompt_returns_error_string(llm):
+    from utils import run_llama_prompt
+    llm.routes["/api/generate"] = error(500, "model crashed")
+
+    result = run_llama_prompt("question")
+    assert result.startswith("Error:")
+    assert "model crashed" in result
+
+def test_run_llama_prompt_caches_answers_but_not_errors(llm):
+    from utils import run_llama_prompt
+    llm.routes["/api/generate"] = sequence(error(500, "busy"), ok("  answer  "))
+
+    assert run_llama_prompt("question").startswith("Error:")
+    assert run_llama_prompt("question") == "answer"
+    assert run_llama_prompt("question") == "answer"
+    assert llm.count("/api/generate") == 2
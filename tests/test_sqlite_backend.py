@@ -0,0 +1,31 @@
+import threading
+
+import sqlite_backend
+
+
+def test_threads_share_one_connection(tmp_path):
+    project = str(tmp_path / "project")
+    sqlite_backend.upsert_note(project, "first", "note")
+
+    # Streamlit runs each rerun on a new thread
+    def rerun(i):
+        sqlite_backend.load_notes(project)
+        sqlite_backend.upsert_note(project, f"paper-{i}", "note")
+    threads = [threading.Thread(target=rerun, args=(i,)) for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(sqlite_backend.load_notes(project)) == 21
+    assert list(sqlite_backend._open) == [str(tmp_path / "project" / "project.db")]
+    sqlite_backend.close_project_db(project)
+    assert not sqlite_backend._open
+
+def test_reopens_after_close(tmp_path):
+    project = str(tmp_path / "project")
+    sqlite_backend.save_config(project, {"name": "project"})
+    sqlite_backend.close_project_db(project)
+
+    assert sqlite_backend.load_config(project) == {"name": "project"}
+    sqlite_backend.close_project_db(project)
@@ -0,0 +1,216 @@
+import os
+import json
+import mmap
+import threading
+from filelock import FileLock
+
+BLOB_FILE = "pages.bin"
+INDEX_FILE = "pages.idx.json"
+LOCK_FILE = "pages.lock"
+COMPACT_MIN_BYTES = 1024 * 1024
+
+
+def paper_key(paper_id):
+    return paper_id.replace("/", "_")
+
+
+#==================== Store ====================#
+
+class TextStore:
+    # Page text for every paper of a project in one append-only UTF-8 blob,
+    # memory-mapped for reads, plus a JSON index of (offset, length) per
+    # page. Writers append to the blob before publishing the index, so a
+    # reader never sees offsets that point at unwritten bytes.
+    def __init__(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.blob_path = os.path.join(folder, BLOB_FILE)
+        self.index_path = os.path.join(folder, INDEX_FILE)
+        self.file_lock = FileLock(os.path.join(folder, LOCK_FILE))
+        self.lock = threading.RLock()
+        self.papers = {}        # key -> {"version": n, "pages": [[page, offset, length], ...]}
+        self.seq = 0            # last version handed out
+        self.garbage = 0        # bytes no longer referenced by the index
+        self._index_mtime = None
+        self._map = None
+        self._map_file = None
+
+        self._migrate_json_caches()
+        self._reload()
+
+    #---------- index ----------#
+
+    def _reload(self):
+        if not os.path.exists(self.index_path):
+            return
+        stat = os.stat(self.index_path)
+        mtime = (stat.st_mtime_ns, stat.st_size)
+        if mtime == self._index_mtime:
+            return
+        with open(self.index_path, "r") as f:
+            index = json.load(f)
+        self.papers = index["papers"]
+        self.seq = index.get("seq", 0)
+        self.garbage = index.get("garbage", 0)
+        self._index_mtime = mtime
+        # Another process may have compacted the blob underneath us
+        self._close_map()
+
+    def _write_index(self):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"papers": self.papers, "seq": self.seq, "garbage": self.garbage}, f)
+        os.replace(tmp, self.index_path)
+        stat = os.stat(self.index_path)
+        self._index_mtime = (stat.st_mtime_ns, stat.st_size)
+
+    #---------- blob ----------#
+
+    def _view(self, end):
+        # Remap only when the blob has grown past the current mapping
+        if self._map is None or len(self._map) < end:
+            self._close_map()
+            self._map_file = open(self.blob_path, "rb")
+            self._map = mmap.mmap(self._map_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _close_map(self):
+        if self._map is not None:
+            self._map.close()
+            self._map_file.close()
+        self._map = self._map_file = None
+
+    def _read(self, offset, length):
+        if length == 0:
+            return ""
+        return self._view(offset + length)[offset:offset + length].decode("utf-8")
+
+    #---------- reads ----------#
+
+    def has(self, paper_id):
+        with self.lock:
+            self._reload()
+            return paper_key(paper_id) in self.papers
+
+    def signature(self, paper_id):
+        # Changes whenever the paper's text is rewritten
+        with self.lock:
+            self._reload()
+            entry = self.papers.get(paper_key(paper_id))
+            return entry["version"] if entry else None
+
+    def get_pages(self, paper_id):
+        with self.lock:
+            self._reload()
+            entry = self.papers.get(paper_key(paper_id))
+            if entry is None:
+                return None
+            return {page: self._read(offset, length) for page, offset, length in entry["pages"]}
+
+    def get_page(self, paper_id, page):
+        with self.lock:
+            self._reload()
+            entry = self.papers.get(paper_key(paper_id), {"pages": []})
+            for p, offset, length in entry["pages"]:
+                if p == str(page):
+                    return self._read(offset, length)
+            return None
+
+    def iter_pages(self, paper_ids=None):
+        # Yields (key, page, text), decoding one page at a time
+        with self.lock:
+            self._reload()
+            keys = [paper_key(p) for p in paper_ids] if paper_ids is not None else list(self.papers)
+            layout = [(k, self.papers[k]["pages"]) for k in keys if k in self.papers]
+        for key, pages in layout:
+            for page, offset, length in pages:
+                with self.lock:
+                    text = self._read(offset, length)
+                yield key, page, text
+
+    #---------- writes ----------#
+
+    def put(self, paper_id, text_by_page):
+        with self.lock, self.file_lock:
+            self._reload()
+            with open(self.blob_path, "ab") as f:
+                offset = f.tell()
+                pages = []
+                for page, text in text_by_page.items():
+                    data = text.encode("utf-8")
+                    f.write(data)
+                    pages.append([str(page), offset, len(data)])
+                    offset += len(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+            key = paper_key(paper_id)
+            if key in self.papers:
+                self.garbage += sum(p[2] for p in self.papers[key]["pages"])
+            self.seq += 1
+            self.papers[key] = {"version": self.seq, "pages": pages}
+            self._write_index()
+
+    def delete(self, paper_id):
+        with self.lock, self.file_lock:
+            self._reload()
+            entry = self.papers.pop(paper_key(paper_id), None)
+            if entry is None:
+                return False
+            self.garbage += sum(p[2] for p in entry["pages"])
+            self._write_index()
+            if self.garbage > COMPACT_MIN_BYTES and self.garbage * 2 > os.path.getsize(self.blob_path):
+                self._compact()
+            return True
+
+    def _compact(self):
+        # Rewrite the blob with live pages only; caller holds both locks
+        tmp = self.blob_path + ".tmp"
+        papers = {}
+        with open(tmp, "wb") as f:
+            for key, entry in self.papers.items():
+                pages = []
+                for page, offset, length in entry["pages"]:
+                    data = self._view(offset + length)[offset:offset + length] if length else b""
+                    pages.append([page, f.tell(), length])
+                    f.write(data)
+                papers[key] = {"version": entry["version"], "pages": pages}
+        self._close_map()
+        os.replace(tmp, self.blob_path)
+        self.papers = papers
+        self.garbage = 0
+        self._write_index()
+
+    #---------- migration ----------#
+
+    def _migrate_json_caches(self):
+        # Older versions kept one "<paper>.json" page dict per paper
+        legacy = [
+            name for name in os.listdir(self.folder)
+            if name.endswith(".json") and name != INDEX_FILE
+        ]
+        if not legacy:
+            return
+        for name in legacy:
+            path = os.path.join(self.folder, name)
+            try:
+                with open(path, "r") as f:
+                    text_by_page = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Could not migrate {path}:", e)
+                continue
+            self.put(name[:-len(".json")], text_by_page)
+            os.remove(path)
+
+
+#==================== Shared Instances ====================#
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_text_store(folder):
+    folder = os.path.abspath(folder)
+    with _stores_lock:
+        if folder not in _stores or not os.path.isdir(folder):
+            _stores[folder] = TextStore(folder)
+        return _stores[folder]
@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from collections import deque
+
+# Set SUMMARAIZE_TRACING=0 to make spans and counters no-ops
+ENABLED = os.environ.get("SUMMARAIZE_TRACING", "1") != "0"
+METRICS_DIR = os.environ.get("SUMMARAIZE_METRICS_DIR", os.path.join("projects", ".metrics"))
+METRICS_PREFIX = "summaraize"
+MAX_TRACE_SPANS = 2000
+RECENT_TRACES = 20
+MAX_TRACE_FILE_BYTES = 5 * 1024 * 1024  # traces.jsonl is rotated to traces.jsonl.1
+
+
+#==================== Metrics ====================#
+
+class Metrics:
+    # Process-wide span timings and counters, shared by every session
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans = {}         # name -> {"count", "sum", "max"} in seconds
+        self.counters = {}      # (name, (("label", "value"), ...)) -> value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            stat = self.spans.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+            stat["count"] += 1
+            stat["sum"] += seconds
+            stat["max"] = max(stat["max"], seconds)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            spans = {name: dict(stat) for name, stat in self.spans.items()}
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+        return {"spans": spans, "counters": counters}
+
+    def hit_rates(self):
+        # {cache: hit share} for every counter with result=hit/miss labels
+        totals = {}
+        for c in self.snapshot()["counters"]:
+            result = c["labels"].get("result")
+            if result in ("hit", "miss"):
+                hit, total = totals.get(c["name"], (0, 0))
+                totals[c["name"]] = (hit + (c["value"] if result == "hit" else 0), total + c["value"])
+        return {name: hit / total for name, (hit, total) in totals.items() if total}
+
+    def prometheus_text(self):
+        snap = self.snapshot()
+        lines = [
+            f"# HELP {METRICS_PREFIX}_span_seconds Time spent in each traced stage.",
+            f"# TYPE {METRICS_PREFIX}_span_seconds summary",
+        ]
+        for name, stat in sorted(snap["spans"].items()):
+            lines.append(f'{METRICS_PREFIX}_span_seconds_count{{span="{name}"}} {stat["count"]}')
+            lines.append(f'{METRICS_PREFIX}_span_seconds_sum{{span="{name}"}} {stat["sum"]:.6f}')
+        # _max is not a summary sample, so it gets a gauge family of its own
+        lines += [
+            f"# HELP {METRICS_PREFIX}_span_seconds_max Longest single run of each traced stage.",
+            f"# TYPE {METRICS_PREFIX}_span_seconds_max gauge",
+        ]
+        for name, stat in sorted(snap["spans"].items()):
+            lines.append(f'{METRICS_PREFIX}_span_seconds_max{{span="{name}"}} {stat["max"]:.6f}')
+        seen = set()
+        for c in snap["counters"]:
+            metric = f"{METRICS_PREFIX}_{c['name']}_total"
+            if metric not in seen:
+                lines.append(f"# TYPE {metric} counter")
+                seen.add(metric)
+            labels = ",".join(f'{k}="{v}"' for k, v in c["labels"].items())
+            lines.append(f"{metric}{{{labels}}} {c['value']}" if labels else f"{metric} {c['value']}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.counters.clear()
+
+
+metrics = Metrics()
+
+
+#==================== Traces ====================#
+
+class Trace:
+    # Spans recorded while one request (a search, a suggestion run) is active
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name, start, seconds, attrs):
+        with self._lock:
+            if len(self.spans) < MAX_TRACE_SPANS:
+                self.spans.append({
+                    "name": name,
+                    "start_ms": round((start - self._t0) * 1000, 3),
+                    "duration_ms": round(seconds * 1000, 3),
+                    "thread": threading.current_thread().name,
+                    **attrs
+                })
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        return {
+            "name": self.name,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "spans": spans
+        }
+
+
+_current = contextvars.ContextVar("summaraize_trace", default=None)
+recent_traces = deque(maxlen=RECENT_TRACES)
+
+
+class span:
+    # with span("encode", rows=64): ...  -- timed into metrics and, if a
+    # trace is active in this context, into the trace as well.
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        record(self.name, self.start, time.perf_counter() - self.start, **self.attrs)
+
+
+class trace:
+    # with trace("search") as t: ...  -- collects the spans of one request,
+    # including those run on pool threads through bind().
+    def __init__(self, name, export=True):
+        self.trace = Trace(name)
+        self.export = export
+
+    def __enter__(self):
+        self.token = _current.set(self.trace)
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self.token)
+        self.trace.duration = time.perf_counter() - self.trace._t0
+        if ENABLED:
+            metrics.observe(f"trace:{self.trace.name}", self.trace.duration)
+            recent_traces.append(self.trace)
+            if self.export:
+                export_trace(self.trace)
+
+
+def record(name, start, seconds, **attrs):
+    # For stages that do not fit a with-block, such as time to first token
+    if not ENABLED:
+        return
+    metrics.observe(name, seconds)
+    active = _current.get()
+    if active is not None:
+        active.add(name, start, seconds, attrs)
+
+def count(name, value=1, **labels):
+    if ENABLED:
+        metrics.inc(name, value, **labels)
+
+def bind(fn):
+    # Executor threads do not inherit context variables; wrap the callable
+    # so spans inside it land in the caller's trace.
+    ctx = contextvars.copy_context()
+    def run(*args, **kwargs):
+        return ctx.copy().run(fn, *args, **kwargs)
+    return run
+
+
+#==================== Export ====================#
+
+_export_lock = threading.Lock()
+
+def export_trace(finished):
+    # traces.jsonl gets one line per request; the metrics files are
+    # rewritten alongside so they are never older than the last trace.
+    try:
+        with _export_lock:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            path = os.path.join(METRICS_DIR, "traces.jsonl")
+            if os.path.exists(path) and os.path.getsize(path) > MAX_TRACE_FILE_BYTES:
+                os.replace(path, path + ".1")
+            with open(path, "a") as f:
+                f.write(json.dumps(finished.to_dict()) + "\n")
+        write_metrics()
+    except OSError as e:
+        print("Could not export trace:", e)
+
+def write_metrics(folder=None):
+    folder = folder or METRICS_DIR
+    os.makedirs(folder, exist_ok=True)
+    for name, data in [
+        ("metrics.prom", metrics.prometheus_text()),
+        ("metrics.json", json.dumps(metrics.snapshot(), indent=2)),
+    ]:
+        tmp = os.path.join(folder, name + ".tmp")
+        with open(tmp, "w") as f:
+            f.write(data)
+        os.replace(tmp, os.path.join(folder, name))